@@ -1,32 +1,72 @@
 import streamlit as st
+import os
 import time
-import pandas as pd
+import threading
 from pathlib import Path
 import base64
-from src.fetch import create_reddit_instance, fetch_recent_posts, fetch_comments_parallel
-from src.preprocess import preprocessposts, preprocesscomments
-from dotenv import load_dotenv
-from helper import (
-    fetch_stats, fetch_post_summary, fetch_comment_summary, 
-    top_performers, activity_analysis, user_insights, get_most_common_words
-)
-import plotly.express as px
-import wordcloud
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
-import matplotlib.pyplot as plt
-
-CLIENT_ID = st.secrets["CLIENT_ID"]
-CLIENT_SECRET = st.secrets["CLIENT_SECRET"]
-USER_AGENT = st.secrets["USER_AGENT"]
-
-reddit = create_reddit_instance(CLIENT_ID, CLIENT_SECRET, USER_AGENT)
+from src.charts import figure, word_cloud_png
+from src.defaults import comment_time_budget, max_posts
+from src.results import create_result_cache, result_key
+
+# Loaded in the background once the landing page is up, and imported for real only when a report is
+# requested: together they pull in pandas, pyarrow, praw and wordcloud, which take longer than the page itself.
+warm_modules = ("src.analysis", "src.store", "src.partitions", "src.checkpoint", "wordcloud")
+
+@st.cache_resource(show_spinner=False)
+def warm_start():
+    # One thread per server process, started on the first page view while the visitor fills in the form.
+    def load():
+        for name in warm_modules:
+            __import__(name)
+
+    thread = threading.Thread(target=load, name="threadinsight-warm-start", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource(show_spinner=False)
+def get_reddit():
+    from src.analysis import credentials_from_env
+    from src.fetch import create_reddit_instance
+
+    # Environment/.env credentials first; Streamlit secrets remain the fallback for the hosted app.
+    client_id, client_secret, user_agent = credentials_from_env()
+    if not client_id:
+        client_id = st.secrets["CLIENT_ID"]
+        client_secret = st.secrets["CLIENT_SECRET"]
+        user_agent = st.secrets["USER_AGENT"]
+    return create_reddit_instance(client_id, client_secret, user_agent)
+
+@st.cache_resource(show_spinner=False)
+def get_post_store():
+    from src.store import PostStore
+
+    return PostStore()
+
+@st.cache_resource(show_spinner=False)
+def get_partition_store():
+    from src.partitions import PartitionStore
+
+    return PartitionStore()
+
+@st.cache_resource(show_spinner=False)
+def get_checkpoint_store():
+    from src.checkpoint import CheckpointStore
+
+    return CheckpointStore()
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    # One cache for every session in this server; REDIS_URL shares it with other app processes too.
+    return create_result_cache(os.environ.get("REDIS_URL"))
 
 st.set_page_config(page_title="ThreadInsight")
 st.title('ThreadInsight')
 
 image_path = Path(__file__).parent / "images"
 
+@st.cache_resource(show_spinner=False)
 def get_image_base64(path):
+    # Read and encoded once per server process rather than on every rerun.
     with open(path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode()
 
@@ -76,236 +116,267 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
+time_windows = {"6 hours": 0.25, "1 day": 1, "3 days": 3, "7 days": 7, "30 days": 30}
+
 with st.form("subreddit_form"):
     subreddit_name = st.text_input("Enter the subreddit name (without r/):", placeholder="e.g., learnpython")
+    window_label = st.selectbox("Time window:", list(time_windows), index=list(time_windows).index("3 days"))
+    post_limit = st.number_input("Maximum posts to fetch:", min_value=100, max_value=1000, value=max_posts, step=100)
     submitted = st.form_submit_button("Get Insights")
 
-if submitted:
-    if subreddit_name:
-        with st.spinner(f"Fetching data from the past 3 days in r/{subreddit_name}. Please wait..."):
-            posts, subscribers = fetch_recent_posts(subreddit_name, reddit)
-            comments = fetch_comments_parallel(posts, reddit)
-            status_placeholder = st.empty()
-
-            if not posts:
-                status_placeholder.warning(f"No posts found in r/{subreddit_name} from the past 3 days.")
-            else:
-                df_posts = preprocessposts(posts)
-                df_comments = preprocesscomments(comments)
-                st.session_state["df_posts"] = df_posts
-                st.session_state["df_comments"] = df_comments
-
-                status_placeholder.success(f"Successfully fetched {len(posts)} posts and {len(comments)} comments.")
-        time.sleep(2)
-        status_placeholder.empty()
-
-        with st.spinner(f"Analyzing Data..."):
-            posts_count, comments_count, start_date, end_date, unique_users = fetch_stats(df_posts, df_comments)
-            st.header(f"Subreddit \"r/{subreddit_name}\" Overview")
-
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Subscribers", f"{subscribers:,}")
-            col1.metric("Unique Users", f"{unique_users}")
-            col2.metric("Total Posts", f"{posts_count}")
-            col2.metric("Total Comments", f"{comments_count}")
-            col3.metric("Start Date", start_date.strftime("%Y-%m-%d"))
-            col3.metric("End Date", end_date.strftime("%Y-%m-%d"))
-
-            post_summary = fetch_post_summary(df_posts)
-            st.header("Posts Summary Metrics")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Avg. Upvotes", post_summary["avg_upvotes"])
-            col1.metric("Locked Posts", post_summary["locked_posts"])
-            col2.metric("Avg. Comments/Post", post_summary["avg_comments"])
-            col2.metric("NSFW Posts", post_summary["nsfw_posts"])
-            col3.metric("Posts with Links", post_summary["link_posts"])
-            col3.metric("Gilded Posts", post_summary["gilded_posts"])
-
-            post_types = df_posts['post_type'].value_counts().reset_index()
-            post_types.columns = ['post_type', 'count']  
-
-            fig_post_types = px.pie(
-                post_types,
-                names='post_type',  
-                values='count',      
-                title='Post Types Distribution',
-                color_discrete_sequence=['#003366']
-            )
-            st.plotly_chart(fig_post_types, use_container_width=True)
-
-            comment_summary = fetch_comment_summary(df_comments)
-            st.header("Comments Summary Metrics")
-            st.metric("Avg. Upvotes per Comment", comment_summary["avg_upvotes"])
-
-            st.subheader("Top 5 Commenters")
-            if comment_summary["top_authors"]:
-                for author, count in comment_summary["top_authors"].items():
-                    st.write(f"- **{author}**: {count} comments")
-            else:
-                st.write("No active commenters found.")
-
-            st.subheader("Comment Frequency by Date (Bar)")
-            st.plotly_chart(px.bar(
-                x=comment_summary["comments_per_date"].index,
-                y=comment_summary["comments_per_date"].values,
-                labels={"x": "Date", "y": "Frequency"},
-                color_discrete_sequence=['#003366']
-            ), use_container_width=True)
-
-            st.subheader("Comment Frequency by Date (Line)")
-            st.plotly_chart(px.line(
-                x=comment_summary["comments_per_date"].index,
-                y=comment_summary["comments_per_date"].values,
-                labels={"x": "Date", "y": "Frequency"},
-                line_shape='linear',
-                markers=True
-            ), use_container_width=True)
-
-            st.subheader("Comment Frequency by Hour (Bar)")
-            st.plotly_chart(px.bar(
-                x=comment_summary["comments_per_hour"].index,
-                y=comment_summary["comments_per_hour"].values,
-                labels={"x": "Hour", "y": "Frequency"},
-                color_discrete_sequence=['#003366']
-            ), use_container_width=True)
-
-            st.subheader("Comment Frequency by Hour (Line)")
-            st.plotly_chart(px.line(
-                x=comment_summary["comments_per_hour"].index,
-                y=comment_summary["comments_per_hour"].values,
-                labels={"x": "Hour", "y": "Frequency"},
-                line_shape='linear',
-                markers=True
-                ), use_container_width=True)
-            
-            st.header("User Insights")
-
-            most_active_users, avg_account_age, new_account_percentage = user_insights(df_posts, df_comments)
-
-            st.subheader("Top 5 Most Active Users")
-            for user, count in most_active_users.items():
-                st.write(f"- **{user}**: {count} total activities")
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.metric("Average Account Age of Top Contributors (days)", avg_account_age)
-            
-            with col2:
-                 st.metric("Percentage of Posts from New Accounts", f"{new_account_percentage}%")
-
-            st.header("Top Performers")
-            top_posts_upvotes, top_posts_engagement, top_comments_upvotes = top_performers(df_posts, df_comments)
-            col1, col2 = st.columns(2)
-            col1.subheader("Top Posts by Upvotes")
-            col1.dataframe(top_posts_upvotes)
-            col2.subheader("Top Posts by Engagement")
-            col2.dataframe(top_posts_engagement)
-
-            st.subheader("Top Comments by Upvotes")
-            st.dataframe(top_comments_upvotes)
-
-            st.header("Activity Analysis")
-            post_hours, post_days, comment_hours = activity_analysis(df_posts, df_comments)
-
-            st.plotly_chart(px.bar(
-                post_hours, x="hour", y="count", title="Post Frequency by Hour",
-                color_discrete_sequence=['#003366']
-            ), use_container_width=True)
-
-            st.plotly_chart(px.line(
-                post_hours, x="hour", y="count", title="Post Frequency by Hour (Line Chart)",
-                markers=True
-            ), use_container_width=True)
-
-            st.plotly_chart(px.bar(
-                post_days, x="date", y="count", title="Posts per Day",
-                color_discrete_sequence=['#003366']
-            ), use_container_width=True)
-
-            st.plotly_chart(px.line(
-                post_days, x="date", y="count", title="Posts per Day (Line Chart)",
-                markers=True
-            ), use_container_width=True)
-
-            st.header("Post Activity Heatmap (Date vs Hour)")
-
-            heatmap_posts = df_posts.copy()
-            heatmap_posts['hour'] = pd.to_datetime(heatmap_posts['created_time'], format='%H:%M:%S').dt.hour
-            heatmap_posts['date'] = heatmap_posts['created_date']
-
-            post_heatmap_grouped = heatmap_posts.groupby(['date', 'hour']).size().reset_index(name='count')
-
-            fig_post_heatmap = px.density_heatmap(
-                post_heatmap_grouped,
-                x="hour",
-                y="date",
-                z="count",
-                color_continuous_scale="Blues",
-                labels={'hour': 'Hour of Day', 'date': 'Date', 'count': 'Post Count'},
-                nbinsx=24
-            )
+warm_start()
 
-            st.plotly_chart(fig_post_heatmap, use_container_width=True)
+refresh_interval = 2
 
-            st.header("Comment Activity Heatmap (Date vs Hour)")
 
-            heatmap_comments = df_comments.copy()
-            heatmap_comments['hour'] = pd.to_datetime(heatmap_comments['comment_created_time'], format='%H:%M:%S').dt.hour
-            heatmap_comments['date'] = heatmap_comments['comment_created_date']
+def chart(report, name, refresh):
+    st.plotly_chart(figure(report, name), use_container_width=True, key=f"{name}_{refresh}")
 
-            comment_heatmap_grouped = heatmap_comments.groupby(['date', 'hour']).size().reset_index(name='count')
 
-            fig_comment_heatmap = px.density_heatmap(
-                comment_heatmap_grouped,
-                x="hour",
-                y="date",
-                z="count",
-                color_continuous_scale="Blues",
-                labels={'hour': 'Hour of Day', 'date': 'Date', 'count': 'Comment Count'},
-                nbinsx=24
-            )
+def chart_variants(report, series, refresh, interactive):
+    # Bar and line show the same series; only the selected variant is built and sent to the browser.
+    variant = "Bar"
+    if interactive:
+        variant = st.radio("Chart type", ["Bar", "Line"], horizontal=True, key=f"{series}_variant",
+                           label_visibility="collapsed")
+    chart(report, f"{series}.{variant.lower()}", refresh)
 
-            st.plotly_chart(fig_comment_heatmap, use_container_width=True)
 
+def render_overview(report, refresh, interactive):
+    posts_count, comments_count, start_date, end_date, unique_users = report.state.stats()
+    st.header(f"Subreddit \"r/{report.subreddit_name}\" Overview")
 
-            st.header("Most Common Words in Posts")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Subscribers", f"{report.subscribers:,}")
+    col1.metric("Unique Users", f"{unique_users}")
+    col2.metric("Total Posts", f"{posts_count}")
+    col2.metric("Total Comments", f"{comments_count}")
+    col3.metric("Start Date", start_date.strftime("%Y-%m-%d"))
+    col3.metric("End Date", end_date.strftime("%Y-%m-%d"))
 
-            common_words = get_most_common_words(df_posts)
 
-            fig_words = px.bar(
-                common_words, 
-                x='Frequency', 
-                y='Word', 
-                orientation='h',
-                title='Top 20 Most Common Words in Posts',
-                color='Frequency',
-                color_continuous_scale='Blues',
-                labels={'Frequency': 'Frequency', 'Word': 'Word'}
-            )
+def render_post_summary(report, refresh, interactive):
+    post_summary = report.state.post_summary()
+    st.header("Posts Summary Metrics")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Avg. Upvotes", post_summary["avg_upvotes"])
+    col1.metric("Locked Posts", post_summary["locked_posts"])
+    col2.metric("Avg. Comments/Post", post_summary["avg_comments"])
+    col2.metric("NSFW Posts", post_summary["nsfw_posts"])
+    col3.metric("Posts with Links", post_summary["link_posts"])
+    col3.metric("Gilded Posts", post_summary["gilded_posts"])
 
-            fig_words.update_layout(
-                yaxis={'categoryorder':'total ascending'}
-            )
+    chart(report, "post_types", refresh)
 
-            st.plotly_chart(fig_words, use_container_width=True)
 
-            st.header("Word Cloud of the Entire Subreddit")
-            full_text = ' '.join(df_posts['title'].fillna('')) + ' ' + ' '.join(df_posts['selftext'].fillna(''))
+def render_comment_summary(report, refresh, interactive):
+    comment_summary = report.comment_summary()
+    st.header("Comments Summary Metrics")
+    st.metric("Avg. Upvotes per Comment", comment_summary["avg_upvotes"])
 
-            wordcloud = wordcloud.WordCloud(
-                width=1000,
-                height=500,
-                background_color='black',
-                colormap='Blues',
-                stopwords=ENGLISH_STOP_WORDS 
-            ).generate(full_text)
+    st.subheader("Top 5 Commenters")
+    if comment_summary["top_authors"]:
+        for author, count in comment_summary["top_authors"].items():
+            st.write(f"- **{author}**: {count} comments")
+    else:
+        st.write("No active commenters found.")
 
-            fig, ax = plt.subplots()
-            ax.imshow(wordcloud, interpolation='bilinear')
-            ax.axis('off')
-            st.pyplot(fig)
+    st.subheader("Comment Frequency by Date")
+    chart_variants(report, "comments_per_date", refresh, interactive)
 
-    else:
-        st.warning("Please enter a subreddit name.")
+    st.subheader("Comment Frequency by Hour")
+    chart_variants(report, "comments_per_hour", refresh, interactive)
+
+
+def render_user_insights(report, refresh, interactive):
+    st.header("User Insights")
+
+    most_active_users, avg_account_age, new_account_percentage = report.user_insights()
+
+    st.subheader("Top 5 Most Active Users")
+    for user, count in most_active_users.items():
+        st.write(f"- **{user}**: {count} total activities")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.metric("Average Account Age of Top Contributors (days)", avg_account_age)
+
+    with col2:
+         st.metric("Percentage of Posts from New Accounts", f"{new_account_percentage}%")
+
+
+def render_top_performers(report, refresh, interactive):
+    st.header("Top Performers")
+    top_posts_upvotes, top_posts_engagement, top_comments_upvotes = report.top_performers()
+    col1, col2 = st.columns(2)
+    col1.subheader("Top Posts by Upvotes")
+    col1.dataframe(top_posts_upvotes)
+    col2.subheader("Top Posts by Engagement")
+    col2.dataframe(top_posts_engagement)
+
+    st.subheader("Top Comments by Upvotes")
+    st.dataframe(top_comments_upvotes)
+
+
+def render_activity(report, refresh, interactive):
+    st.header("Activity Analysis")
+    chart_variants(report, "post_hours", refresh, interactive)
+    chart_variants(report, "post_days", refresh, interactive)
+
+
+def render_post_heatmap(report, refresh, interactive):
+    st.header("Post Activity Heatmap (Date vs Hour)")
+    chart(report, "post_heatmap", refresh)
+
+
+def render_comment_heatmap(report, refresh, interactive):
+    st.header("Comment Activity Heatmap (Date vs Hour)")
+    chart(report, "comment_heatmap", refresh)
+
+
+def render_velocity(report, refresh, interactive):
+    st.header("Engagement Velocity")
+    st.caption("Average comments per post per hour, by time since the post went up.")
+    # Every resolution is precomputed in the report; switching only picks another cached chart.
+    bucket = "1h"
+    if interactive:
+        bucket = st.radio("Bucket size", ["5min", "1h", "1d"], index=1, horizontal=True, key="velocity_bucket",
+                          label_visibility="collapsed")
+    chart(report, f"velocity.{bucket}", refresh)
+
+    st.subheader("Fastest Posts (peak comments per hour)")
+    st.dataframe(report.fastest_posts(bucket))
+
+
+def render_words(report, refresh, interactive):
+    st.header("Most Common Words in Posts")
+    chart(report, "common_words", refresh)
+
+    st.header("Word Cloud of the Entire Subreddit")
+    st.image(word_cloud_png(report), use_container_width=True)
+
+
+sections = {
+    "overview": render_overview,
+    "post_summary": render_post_summary,
+    "comment_summary": render_comment_summary,
+    "user_insights": render_user_insights,
+    "top_performers": render_top_performers,
+    "activity": render_activity,
+    "post_heatmap": render_post_heatmap,
+    "comment_heatmap": render_comment_heatmap,
+    "velocity": render_velocity,
+    "words": render_words
+}
+post_sections = ["overview", "post_summary", "activity", "post_heatmap", "words"]
+comment_sections = ["overview", "comment_summary", "user_insights", "top_performers", "comment_heatmap", "velocity"]
+
+
+def render_sections(report, placeholders, names, refresh, interactive=False):
+    # Chart toggles are only offered once the report is final; while comments stream in the same
+    # placeholders are redrawn several times per run and a widget can only be created once.
+    for name in names:
+        with placeholders[name].container():
+            sections[name](report, refresh, interactive)
+
+
+def report_status(report):
+    coverage = report.coverage
+    if coverage["truncated"]:
+        return ("info",
+            f"Comment fetching stopped at the {comment_time_budget}s budget: the busiest "
+            f"{coverage['posts_fetched']} of {coverage['posts_total']} posts were read, covering "
+            f"{coverage['coverage']:.0%} of {coverage['comments_expected']:,} comments."
+        )
+    if coverage.get("failed_posts"):
+        return ("warning",
+            f"Fetched {report.posts_count} posts and {report.comments_count} comments, but "
+            f"{len(coverage['failed_posts'])} comment threads could not be read; running the analysis "
+            f"again retries them."
+        )
+    return ("success", f"Successfully fetched {report.posts_count} posts and {report.comments_count} comments.")
+
+
+def show_report(report, status_placeholder=None, placeholders=None):
+    kind, message = report_status(report)
+    getattr(status_placeholder or st.empty(), kind)(message)
+    placeholders = placeholders or {name: st.empty() for name in sections}
+    render_sections(report, placeholders, list(sections), "final", interactive=True)
+
+    with st.expander("Run details"):
+        st.json(report.run_metrics)
+
+
+def stream_report(updates, status_placeholder, placeholders, spinner_text):
+    # Runs in the session that leads the fetch: renders posts first, then the comment-driven sections
+    # as the analysis reports each comment batch folded into its running aggregates.
+    with st.spinner(spinner_text):
+        report = next(updates)
+    if not report.posts_count:
+        for report in updates:
+            pass
+        return report
+
+    refresh = 0
+    render_sections(report, placeholders, post_sections, refresh)
+    last_render = 0
+    for report in updates:
+        coverage = report.coverage
+        status_placeholder.info(
+            f"Fetched {report.posts_count} posts and {report.comments_count} comments "
+            f"({coverage['posts_fetched']} of {coverage['posts_total']} comment threads)..."
+        )
+        if report.complete:
+            break
+        if report.comments_count and time.monotonic() - last_render >= refresh_interval:
+            refresh += 1
+            render_sections(report, placeholders, comment_sections, refresh)
+            last_render = time.monotonic()
+    return report
+
+
+if submitted and not subreddit_name:
+    st.warning("Please enter a subreddit name.")
+
+elif submitted:
+    # Waits for the warm-start imports rather than importing the same modules from two threads at once.
+    warm_start().join()
+    from src.analysis import ThreadInsight
+
+    days = time_windows[window_label]
+    insight = ThreadInsight(
+        get_reddit(), get_post_store(), comment_time_budget=comment_time_budget, partitions=get_partition_store(),
+        checkpoints=get_checkpoint_store()
+    )
+    results = get_result_cache()
+    key = result_key(subreddit_name, days, int(post_limit))
+
+    # Reports are shared between sessions: a fresh one is shown as is, a stale one is shown while a
+    # background refresh runs, and a miss either leads the fetch or waits on the session already doing it.
+    report = results.get(key, refresh=lambda: insight.analyze(subreddit_name, days=days, max_posts=int(post_limit)))
+    status_placeholder = st.empty()
+    placeholders = {name: st.empty() for name in sections}
+    if report is None:
+        flight, leader = results.claim(key)
+        if leader:
+            updates = insight.stream(subreddit_name, days=days, max_posts=int(post_limit))
+            spinner_text = f"Fetching posts from the past {window_label} in r/{subreddit_name}. Please wait..."
+            report = results.lead(
+                key, flight, lambda: stream_report(updates, status_placeholder, placeholders, spinner_text)
+            )
+        else:
+            with st.spinner(f"r/{subreddit_name} is already being fetched for another viewer. Please wait..."):
+                report = results.wait(flight)
+
+    if not report.posts_count:
+        st.session_state.pop("report", None)
+        status_placeholder.warning(f"No posts found in r/{subreddit_name} from the past {window_label}.")
+        st.stop()
+
+    # Kept for reruns (chart toggles, other widgets), which redraw from the figure cache instead of refetching.
+    st.session_state["report"] = report
+    show_report(report, status_placeholder, placeholders)
 
+elif "report" in st.session_state:
+    show_report(st.session_state["report"])
@@ -0,0 +1,409 @@
+import argparse
+import ast
+import fnmatch
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+import helper
+from src.aggregate import AggregateState
+from src.columnar import comment_schema
+from src.fetch import build_post_record, fetch_comments_parallel, fetch_recent_posts
+from src.preprocess import preprocesscomments, preprocessposts
+from src.ratelimit import TokenBucket
+from src.source import ReplaySource, synthetic_fixture
+from src.terms import TermIndex
+from src.threads import thread_structure
+
+# (posts, comments) per preset; 50k posts / 5M comments needs several GB of memory.
+sizes = {
+    "small": (500, 10_000),
+    "medium": (5_000, 250_000),
+    "large": (50_000, 5_000_000)
+}
+default_sizes = ["small", "medium"]
+
+# The simulated API for the fetch cases: per-request latency plus a quota of fetch_rate_limit requests
+# per fetch_rate_period seconds, small enough that the quota actually binds during the run.
+fetch_size = (200, 4_000)
+fetch_latency = 0.01
+fetch_jitter = 0.01
+fetch_rate_limit = 100
+fetch_rate_period = 5.0
+
+# App cold start: wall time of app.py's own top-level imports in a fresh interpreter, on top of streamlit,
+# which every Streamlit page pays anyway. "startup.landing" runs before the form is drawn and is held to
+# startup_budget seconds; "startup.warm" is what the app's warm-start thread loads behind it. Neither may
+# pull in the modules in landing_excluded.
+startup_budget = 0.25
+landing_excluded = ("pandas", "pyarrow", "praw", "sklearn", "matplotlib")
+startup_script = """
+import json, sys, time
+import streamlit
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    __import__(name)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [name for name in sys.argv[1].split(",") if name in sys.modules]}))
+"""
+
+regression_threshold = 0.10
+results_path = root / "benchmarks" / "results"
+
+words = np.array([
+    "python", "data", "help", "question", "project", "code", "learn", "error", "release", "update",
+    "guide", "issue", "today", "best", "first", "new", "using", "build", "test", "idea", "library",
+    "performance", "memory", "function", "class", "module", "server", "client", "request", "thread"
+])
+
+
+def synthetic_records(n_posts, n_comments, days=3, seed=0, now=None):
+    # Post records as fetch_recent_posts returns them and comments as one Arrow batch, generated with
+    # NumPy so the 5M-comment preset takes seconds rather than the per-row synthetic_fixture loop.
+    rng = np.random.default_rng(seed)
+    now = int(time.time() if now is None else now)
+    n_authors = max(10, (n_posts + n_comments) // 8)
+    names = np.array([f"user_{i}" for i in range(n_authors)] + ["[deleted]", "AutoModerator"], dtype=object)
+    weights = 1 / np.arange(1, n_authors + 1)
+    weights = np.concatenate([weights / weights.sum() * 0.97, [0.015, 0.015]])
+    account_age_days = np.floor(rng.exponential(900, len(names)))
+
+    post_authors = rng.choice(len(names), n_posts, p=weights)
+    post_created = np.floor(now - rng.uniform(0, days * 86400, n_posts))
+    post_weights = rng.pareto(1.1, n_posts) + 1
+    comment_posts = rng.choice(n_posts, n_comments, p=post_weights / post_weights.sum())
+    num_comments = np.bincount(comment_posts, minlength=n_posts)
+    scores = np.floor(rng.pareto(1.2, n_posts)).astype(int)
+    kinds = rng.random(n_posts)
+    flags = rng.random((n_posts, 4))
+
+    posts = []
+    for i in range(n_posts):
+        if kinds[i] < 0.15:
+            url = f"https://i.redd.it/{i}.jpg"
+        elif kinds[i] < 0.25:
+            url = f"https://v.redd.it/{i}"
+        else:
+            url = f"https://www.reddit.com/comments/p{i}/"
+        selftext = " ".join(rng.choice(words, rng.integers(0, 40)))
+        if flags[i, 3] < 0.1:
+            selftext += " https://example.com"
+        author = names[post_authors[i]]
+        posts.append(build_post_record({
+            "id": f"p{i}",
+            "author": author,
+            "title": " ".join(rng.choice(words, rng.integers(3, 12))),
+            "selftext": selftext,
+            "is_self": kinds[i] >= 0.25,
+            "num_comments": int(num_comments[i]),
+            "over_18": flags[i, 0] < 0.02,
+            "spoiler": flags[i, 1] < 0.01,
+            "locked": flags[i, 2] < 0.01,
+            "gilded": 0,
+            "score": int(scores[i]),
+            "created_utc": float(post_created[i]),
+            "url": url
+        }, None if post_authors[i] >= n_authors else float(account_age_days[post_authors[i]])))
+
+    comment_created = post_created[comment_posts] + np.floor(
+        np.minimum(now - post_created[comment_posts], rng.exponential(7200, n_comments))
+    )
+    # Reply trees: in each post's thread, ordered by time, a comment answers the post or one of the few
+    # comments just before it. Worked out in thread order, then mapped back to the comment numbers.
+    order = np.lexsort((comment_created, comment_posts))
+    position = np.arange(n_comments) - np.repeat(np.cumsum(num_comments) - num_comments, num_comments)
+    back = 1 + np.floor(rng.exponential(5, n_comments)).astype(np.int64)
+    reply = (rng.random(n_comments) < 0.6) & (position > 0)
+    parent = np.where(reply, np.arange(n_comments) - np.minimum(back, position), -1)
+    # Depth by pointer jumping: each round adds the depth of the current ancestor and skips to its
+    # ancestor, so the loop runs log2(max depth) times.
+    depth = reply.astype(np.int64)
+    ancestor = parent.copy()
+    while (ancestor >= 0).any():
+        has = ancestor >= 0
+        depth[has] += depth[ancestor[has]]
+        ancestor[has] = ancestor[ancestor[has]]
+    # Dictionary of every possible parent: comments c0.. first, then posts p0..
+    parent_ids = np.empty(n_comments, np.int64)
+    parent_ids[order] = np.where(reply, order[np.maximum(parent, 0)], n_comments + comment_posts[order])
+    comment_depth = np.empty(n_comments, np.int64)
+    comment_depth[order] = depth
+
+    comments = pa.RecordBatch.from_arrays([
+        pa.array([f"c{i}" for i in range(n_comments)], pa.string()),
+        pa.DictionaryArray.from_arrays(
+            pa.array(rng.choice(len(names), n_comments, p=weights), pa.int32()), pa.array(names, pa.string())
+        ),
+        pa.array(np.floor(rng.pareto(1.5, n_comments)).astype(np.int64)),
+        pa.array(comment_created),
+        pa.DictionaryArray.from_arrays(
+            pa.array(comment_posts, pa.int32()), pa.array([f"p{i}" for i in range(n_posts)], pa.string())
+        ),
+        pa.DictionaryArray.from_arrays(
+            pa.array(parent_ids, pa.int32()),
+            pa.array([f"t1_c{i}" for i in range(n_comments)] + [f"t3_p{i}" for i in range(n_posts)], pa.string())
+        ),
+        pa.array(comment_depth)
+    ], schema=comment_schema)
+    return posts, comments
+
+
+def word_cloud(df_posts):
+    import wordcloud
+
+    terms = TermIndex().add_posts(df_posts)
+    wordcloud.WordCloud(width=1000, height=500, background_color="black", colormap="Blues") \
+        .generate_from_frequencies(terms.frequencies)
+
+
+def analysis_cases(posts, comments):
+    # Each case is (function, rows it processes). Frames are preprocessed once up front so the helper
+    # timings don't include preprocessing.
+    df_posts = preprocessposts(posts)
+    df_comments = preprocesscomments(comments)
+    rows = len(df_posts) + len(df_comments)
+    return {
+        "preprocess.posts": (lambda: preprocessposts(posts), len(posts)),
+        "preprocess.comments": (lambda: preprocesscomments(comments), len(comments)),
+        "helper.fetch_stats": (lambda: helper.fetch_stats(df_posts, df_comments), rows),
+        "helper.fetch_post_summary": (lambda: helper.fetch_post_summary(df_posts), len(df_posts)),
+        "helper.fetch_comment_summary": (lambda: helper.fetch_comment_summary(df_comments), len(df_comments)),
+        "helper.top_performers": (lambda: helper.top_performers(df_posts, df_comments), rows),
+        "helper.activity_analysis": (lambda: helper.activity_analysis(df_posts, df_comments), rows),
+        "helper.activity_heatmap": (
+            lambda: helper.activity_heatmap(df_comments, "comment_created"), len(df_comments)
+        ),
+        "helper.user_insights": (lambda: helper.user_insights(df_posts, df_comments), rows),
+        "helper.get_author_activity": (lambda: helper.get_author_activity(df_posts, df_comments), rows),
+        "helper.get_most_common_words": (lambda: helper.get_most_common_words(df_posts), len(df_posts)),
+        "aggregate.state": (lambda: AggregateState().add_posts(df_posts).add_comments(df_comments), rows),
+        "aggregate.state.approximate": (
+            lambda: AggregateState(approximate=True).add_posts(df_posts).add_comments(df_comments), rows
+        ),
+        "threads.structure": (lambda: thread_structure(df_comments, df_posts), len(df_comments)),
+        "wordcloud": (lambda: word_cloud(df_posts), len(df_posts))
+    }
+
+
+def fetch_cases():
+    # Full post + comment fetch against the simulated API; each run gets a fresh source so the quota
+    # window starts empty. "courtesy" is the default path with fixed sleeps, "token_bucket" paces by quota.
+    fixture = synthetic_fixture("bench", *fetch_size)
+
+    def run(limiter_factory):
+        source = ReplaySource({"bench": fixture}, latency=fetch_latency, jitter=fetch_jitter,
+                              rate_limit=fetch_rate_limit, rate_period=fetch_rate_period, seed=0)
+        limiter = limiter_factory()
+        posts, _ = fetch_recent_posts("bench", source, limiter=limiter)
+        fetch_comments_parallel(posts, source, limiter=limiter)
+        return {"requests": source.requests, "rate_limited": source.rate_limited}
+
+    rows = sum(fetch_size)
+    return {
+        "fetch.courtesy": (lambda: run(lambda: None), rows),
+        "fetch.token_bucket": (lambda: run(lambda: TokenBucket(fetch_rate_limit / fetch_rate_period)), rows)
+    }
+
+
+def app_imports(path=root / "app.py"):
+    # Modules app.py imports at the top level, besides streamlit, and the ones it lists in warm_modules.
+    landing, warm = [], []
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.Import):
+            landing += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            landing.append(node.module)
+        elif isinstance(node, ast.Assign) and "warm_modules" in [getattr(name, "id", None) for name in node.targets]:
+            warm = list(ast.literal_eval(node.value))
+    return [name for name in landing if name != "streamlit"], warm
+
+
+def startup_cases():
+    landing, warm = app_imports()
+    return {"startup.landing": landing, "startup.warm": warm}
+
+
+def time_startup(modules, repeat):
+    # Each run is a fresh interpreter, so nothing is already imported; the timing is taken inside it.
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", startup_script, ",".join(landing_excluded), *modules],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return {
+        "seconds_min": round(min(timings), 5),
+        "seconds_median": round(statistics.median(timings), 5),
+        "runs": repeat,
+        "modules": modules,
+        "loaded_excluded": loaded
+    }
+
+
+def time_case(func, rows, repeat, details=False):
+    # With details, the dict the last run returned (request counts for the fetch cases) goes into the result.
+    timings = []
+    extra = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extra = func()
+        timings.append(time.perf_counter() - start)
+    result = {
+        "seconds_min": round(min(timings), 5),
+        "seconds_median": round(statistics.median(timings), 5),
+        "runs": repeat,
+        "rows": rows,
+        "rows_per_second": round(rows / min(timings), 1) if min(timings) else None
+    }
+    if details:
+        result.update(extra)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(size_names, custom=None, repeat=3, fetch_repeat=1, skip_fetch=False, pattern="*", skip_startup=False):
+    presets = {name: sizes[name] for name in size_names}
+    if custom:
+        presets["custom"] = custom
+
+    results = {}
+    if not skip_startup:
+        results["startup"] = {}
+        print("[startup] app imports on top of streamlit, fresh interpreter per run", flush=True)
+        for case, modules in startup_cases().items():
+            if fnmatch.fnmatch(case, pattern):
+                results["startup"][case] = time_startup(modules, repeat)
+                print(f"  {case:<32} {results['startup'][case]['seconds_min']:>10.4f}s", flush=True)
+
+    for size_name, (n_posts, n_comments) in presets.items():
+        print(f"[{size_name}] generating {n_posts:,} posts / {n_comments:,} comments", flush=True)
+        posts, comments = synthetic_records(n_posts, n_comments)
+        results[size_name] = {}
+        for case, (func, rows) in analysis_cases(posts, comments).items():
+            if fnmatch.fnmatch(case, pattern):
+                results[size_name][case] = time_case(func, rows, repeat)
+                print(f"  {case:<32} {results[size_name][case]['seconds_min']:>10.4f}s", flush=True)
+
+    if not skip_fetch:
+        results["fetch"] = {}
+        print(f"[fetch] {fetch_size[0]:,} posts / {fetch_size[1]:,} comments, {fetch_latency}s latency, "
+              f"{fetch_rate_limit} requests per {fetch_rate_period}s", flush=True)
+        for case, (func, rows) in fetch_cases().items():
+            if fnmatch.fnmatch(case, pattern):
+                results["fetch"][case] = time_case(func, rows, fetch_repeat, details=True)
+                print(f"  {case:<32} {results['fetch'][case]['seconds_min']:>10.4f}s", flush=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "pyarrow": pa.__version__,
+            "sizes": {**presets, **({} if skip_fetch else {"fetch": fetch_size})},
+            "repeat": repeat
+        },
+        "results": results
+    }
+
+
+def compare(baseline, current, threshold=regression_threshold):
+    # Compares best-of-N times case by case; returns the cases that got slower than the threshold.
+    regressions = []
+    print(f"\n{'size':<8} {'case':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size_name, cases in current["results"].items():
+        for case, result in cases.items():
+            before = baseline["results"].get(size_name, {}).get(case)
+            if not before:
+                continue
+            change = result["seconds_min"] / before["seconds_min"] - 1 if before["seconds_min"] else 0.0
+            flag = " !" if change > threshold else ""
+            print(f"{size_name:<8} {case:<32} {before['seconds_min']:>10.4f} {result['seconds_min']:>10.4f} "
+                  f"{change:>+8.1%}{flag}")
+            if change > threshold:
+                regressions.append((size_name, case, change))
+    return regressions
+
+
+def over_budget(current, budget=startup_budget):
+    # The landing imports must stay under the budget and clear of the heavy modules, whatever the baseline.
+    landing = current["results"].get("startup", {}).get("startup.landing")
+    if not landing:
+        return []
+    problems = []
+    if landing["seconds_min"] > budget:
+        problems.append(f"startup.landing took {landing['seconds_min']:.3f}s, over the {budget}s budget")
+    if landing["loaded_excluded"]:
+        problems.append(f"startup.landing imported {', '.join(landing['loaded_excluded'])}")
+    for problem in problems:
+        print(f"! {problem}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ThreadInsight's fetch, preprocess and analysis paths.")
+    parser.add_argument("--sizes", default=",".join(default_sizes),
+                        help=f"comma-separated presets from {', '.join(sizes)}")
+    parser.add_argument("--posts", type=int, default=None, help="custom size: number of posts")
+    parser.add_argument("--comments", type=int, default=None, help="custom size: number of comments")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per analysis case; the best time is compared")
+    parser.add_argument("--fetch-repeat", type=int, default=1, help="runs per fetch case")
+    parser.add_argument("--skip-fetch", action="store_true", help="skip the simulated-API fetch cases")
+    parser.add_argument("--skip-startup", action="store_true", help="skip the app import-time cases")
+    parser.add_argument("--startup-budget", type=float, default=startup_budget,
+                        help="seconds the app's landing imports may take on top of streamlit")
+    parser.add_argument("--cases", default="*", help="glob over case names, e.g. 'helper.*'")
+    parser.add_argument("--out", default=None, help="result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="baseline result file to compare against")
+    parser.add_argument("--threshold", type=float, default=regression_threshold,
+                        help="slowdown that counts as a regression, as a fraction")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit with status 1 on any regression or a startup budget overrun")
+    args = parser.parse_args(argv)
+
+    size_names = [name for name in args.sizes.split(",") if name]
+    custom = (args.posts, args.comments) if args.posts is not None and args.comments is not None else None
+    current = run(size_names, custom, args.repeat, args.fetch_repeat, args.skip_fetch, args.cases, args.skip_startup)
+
+    out = Path(args.out) if args.out else results_path / f"{current['meta']['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nresults written to {out}")
+
+    failed = bool(over_budget(current, args.startup_budget))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = bool(compare(baseline, current, args.threshold)) or failed
+    if failed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
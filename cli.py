@@ -0,0 +1,86 @@
+import argparse
+import json
+from src.analysis import credentials_from_env
+from src.checkpoint import CheckpointStore
+from src.batch import analysis_workers, run_batch
+from src.fetch import create_reddit_instance, days_to_fetch, max_posts
+from src.metrics import metrics
+from src.partitions import PartitionStore
+from src.ratelimit import TokenBucket
+from src.source import load_fixtures
+from src.store import PostStore
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze subreddits without the Streamlit UI.")
+    parser.add_argument("subreddits", nargs="*", help="subreddit names, without r/")
+    parser.add_argument("--subreddit-file", default=None, help="file with one subreddit name per line")
+    parser.add_argument("--days", type=float, default=days_to_fetch,
+                        help="analysis window in days; fractions work for hours, e.g. 0.25 for 6 hours")
+    parser.add_argument("--max-posts", type=int, default=max_posts, help="cap on posts fetched per subreddit")
+    parser.add_argument("--data-dir", default=None,
+                        help="keep fetched days as Parquet partitions here and reuse them on later runs")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="save comment fetch progress here so an interrupted run resumes where it stopped")
+    parser.add_argument("--out", default="reports", help="directory the reports are written to")
+    parser.add_argument("--format", choices=["json", "parquet"], default="json",
+                        help="json writes one summary per subreddit; parquet adds the row-level tables")
+    parser.add_argument("--comment-time-budget", type=float, default=None,
+                        help="seconds to spend fetching comments per subreddit (default: no limit)")
+    parser.add_argument("--cache", default=None, help="SQLite cache path shared with the app")
+    parser.add_argument("--fixtures", default=None, help="replay recorded fixtures from this directory instead of Reddit")
+    parser.add_argument("--metrics-out", default=None, help="write the run's timings and API counters as JSON here")
+    parser.add_argument("--prometheus", default=None, help="write the same metrics in Prometheus text format here")
+    parser.add_argument("--approximate", action="store_true",
+                        help="count users, top authors and words with fixed-size sketches instead of exact counters")
+    parser.add_argument("--workers", type=int, default=analysis_workers,
+                        help="processes used for preprocessing and analysis")
+    args = parser.parse_args(argv)
+    if args.subreddit_file:
+        with open(args.subreddit_file, encoding="utf-8") as f:
+            args.subreddits += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not args.subreddits:
+        parser.error("give at least one subreddit or --subreddit-file")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    limiter = None
+    if args.fixtures:
+        reddit = create_reddit_instance(backend="replay", fixtures=load_fixtures(args.fixtures))
+    else:
+        client_id, client_secret, user_agent = credentials_from_env()
+        if not client_id:
+            raise SystemExit("Set CLIENT_ID, CLIENT_SECRET and USER_AGENT in the environment or a .env file.")
+        reddit = create_reddit_instance(client_id, client_secret, user_agent)
+        # One bucket for the whole run, so the API quota is shared across every subreddit in the list.
+        limiter = TokenBucket()
+
+    store = PostStore(args.cache) if args.cache else None
+    snapshot = metrics.snapshot()
+    comparison, failures = run_batch(
+        args.subreddits, reddit, store, limiter, out_dir=args.out, format=args.format,
+        comment_time_budget=args.comment_time_budget, workers=args.workers, days=args.days,
+        max_posts=args.max_posts, partitions=PartitionStore(args.data_dir) if args.data_dir else None,
+        checkpoints=CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None,
+        approximate=args.approximate
+    )
+    if not comparison.empty:
+        print(comparison[["subreddit", "posts", "comments", "unique_users"]].to_string(index=False))
+    if "unique_users_total" in comparison.attrs:
+        print(f"~{comparison.attrs['unique_users_total']:,} unique users across all subreddits")
+    for subreddit_name, error in failures.items():
+        print(f"r/{subreddit_name}: skipped ({error})")
+
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f:
+            json.dump(metrics.report(since=snapshot), f, indent=2)
+    if args.prometheus:
+        with open(args.prometheus, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,11 @@
-import pandas as pd
-from collections import Counter
-import re
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from src.terms import TermIndex
+from src.topk import author_activity, excluded_comment_authors, excluded_commenters, top_authors, top_k, top_rows
 
-def get_most_common_words(df_posts, top_n=20):
-    stop_words = ENGLISH_STOP_WORDS
-    combined_text = (df_posts['title'].fillna('') + ' ' + df_posts['selftext'].fillna('')).str.lower()
-    all_text = ' '.join(combined_text)
+def get_most_common_words(df_posts, top_n=20, index=None):
+    if index is None:
+        index = TermIndex().add_posts(df_posts)
 
-    words = re.findall(r'\b\w+\b', all_text)
-    filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
-
-    word_counts = Counter(filtered_words).most_common(top_n)
-
-    word_df = pd.DataFrame(word_counts, columns=['Word', 'Frequency'])
-
-    return word_df
+    return index.most_common(top_n)
 
 def fetch_stats(df_posts, df_comments):
     posts_count = len(df_posts)
@@ -52,24 +42,22 @@ def fetch_post_summary(df_posts):
     }
 
 
-def fetch_comment_summary(df_comments):
+def get_author_activity(df_posts, df_comments):
+    # Compute once per dataset and pass as activity= to the summaries below instead of regrouping per call.
+    return author_activity(df_posts["author"], df_comments["comment_author"])
+
+
+def fetch_comment_summary(df_comments, activity=None, k=top_k, excluded_authors=excluded_commenters):
     total_comments = len(df_comments)
     avg_upvotes = round(df_comments["comment_upvotes"].mean(), 2)
 
-    excluded_authors = ["[deleted]", "AutoModerator"]
-    author_counts = (
-        df_comments[~df_comments["comment_author"].isin(excluded_authors)]
-        .groupby("comment_author")
-        .size()
-        .sort_values(ascending=False)
-        .head(5)
-        .to_dict()
-    )
+    if activity is None:
+        activity = author_activity([], df_comments["comment_author"])
+    author_counts = top_authors(activity, "comments", k, excluded_authors).to_dict()
 
     comments_per_date = df_comments["comment_created_date"].value_counts().sort_index()
 
-    df_comments["comment_hour"] = pd.to_datetime(df_comments["comment_created_time"], format="%H:%M:%S").dt.hour
-    comments_per_hour = df_comments["comment_hour"].value_counts().sort_index()
+    comments_per_hour = df_comments["comment_created_hour"].value_counts().sort_index()
 
     return {
         "total_comments": total_comments,
@@ -79,13 +67,14 @@ def fetch_comment_summary(df_comments):
         "comments_per_hour": comments_per_hour
     }
 
-def top_performers(df_posts, df_comments):
-    top_posts_upvotes = df_posts.nlargest(5, 'upvotes')[['title', 'author', 'upvotes', 'num_comments']].reset_index(drop=True)
-    df_posts['engagement'] = df_posts['upvotes'] + df_posts['num_comments']
-    top_posts_engagement = df_posts.nlargest(5, 'engagement')[['title', 'author', 'engagement']].reset_index(drop=True)
+def top_performers(df_posts, df_comments, k=top_k, excluded_authors=excluded_comment_authors):
+    top_posts_upvotes = top_rows(df_posts, 'upvotes', ['title', 'author', 'upvotes', 'num_comments'], k)
+    top_posts_engagement = top_rows(df_posts, 'engagement_score', ['title', 'author', 'engagement_score'], k)
+    top_posts_engagement.columns = ['title', 'author', 'engagement']
 
-    filtered_comments = df_comments[df_comments['comment_author'].str.lower() != 'automoderator']
-    top_comments_upvotes = filtered_comments.nlargest(5, 'comment_upvotes')[['comment_author', 'comment_upvotes']].reset_index(drop=True)
+    top_comments_upvotes = top_rows(
+        df_comments, 'comment_upvotes', ['comment_author', 'comment_upvotes'], k, excluded_authors, 'comment_author'
+    )
 
     return top_posts_upvotes, top_posts_engagement, top_comments_upvotes
 
@@ -94,8 +83,7 @@ def top_performers(df_posts, df_comments):
 
 def activity_analysis(df_posts, df_comments):
     post_hours = (
-        df_posts["created_time"]
-        .apply(lambda x: x.hour)
+        df_posts["created_hour"]
         .value_counts()
         .sort_index()
         .reset_index()
@@ -109,8 +97,7 @@ def activity_analysis(df_posts, df_comments):
     )
     post_days.columns = ["date", "count"]
     comment_hours = (
-        df_comments["comment_created_time"]
-        .apply(lambda x: x.hour)
+        df_comments["comment_created_hour"]
         .value_counts()
         .sort_index()
         .reset_index()
@@ -120,12 +107,20 @@ def activity_analysis(df_posts, df_comments):
     return post_hours, post_days, comment_hours
 
 
-def user_insights(df_posts, df_comments, new_threshold_days=30):
-    post_authors = df_posts['author'].dropna()
-    comment_authors = df_comments['comment_author'].dropna()
-    
-    combined_authors = pd.concat([post_authors, comment_authors])
-    most_active_users = combined_authors.value_counts().head(5)
+def activity_heatmap(df, prefix="created"):
+    grouped = (
+        df.groupby([f"{prefix}_date", f"{prefix}_hour"], observed=True)
+        .size()
+        .reset_index()
+    )
+    grouped.columns = ["date", "hour", "count"]
+    return grouped
+
+
+def user_insights(df_posts, df_comments, new_threshold_days=30, activity=None, k=top_k):
+    if activity is None:
+        activity = get_author_activity(df_posts, df_comments)
+    most_active_users = top_authors(activity, "total", k)
     
     top_contributors = df_posts[df_posts['author'].isin(most_active_users.index)]
     avg_account_age = int(top_contributors['account_age_days'].mean())
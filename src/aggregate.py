@@ -0,0 +1,236 @@
+import heapq
+import itertools
+from collections import Counter
+import pandas as pd
+from src.preprocess import seconds
+from src.sketches import CountMin, HyperLogLog, SpaceSaving
+from src.topk import excluded_comment_authors, excluded_commenters, top_counts, top_k, top_k_indices, top_rows
+from src.velocity import VelocityRollup
+
+
+def counts(values):
+    # Categorical columns report every category, including ones absent from this batch; drop those zeros.
+    counted = values.value_counts(sort=False)
+    return counted[counted > 0].to_dict()
+
+
+class TopK:
+    # Min-heap of (value, -sequence, row) so that, like nlargest(keep="first"), earlier rows win ties.
+    def __init__(self, k=top_k):
+        self.k = k
+        self.heap = []
+
+    def push(self, value, sequence, row):
+        item = (value, -sequence, row)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+
+    def merge(self, other):
+        for value, sequence, row in other.heap:
+            self.push(value, -sequence, row)
+
+    def rows(self):
+        return [row for _, _, row in sorted(self.heap, key=lambda x: x[:2], reverse=True)]
+
+
+class AggregateState:
+    # Running totals behind every helper.py analysis. Batches are folded in with add_posts/add_comments
+    # and states built on different shards are combined with merge, so refreshing a cached subreddit
+    # only has to aggregate the new rows.
+    # With approximate=True the per-author counters are replaced by fixed-size sketches (src/sketches.py):
+    # unique users come from a HyperLogLog, the top authors from Space-Saving and the top authors'
+    # account ages from Count-Min, so memory stays flat over long windows and many merged subreddits.
+    def __init__(self, k=top_k, excluded_commenters=excluded_commenters,
+                 excluded_comment_authors=excluded_comment_authors, approximate=False):
+        self.k = k
+        self.approximate = approximate
+        self.excluded_commenters = excluded_commenters
+        self.excluded_comment_authors = excluded_comment_authors
+        self._sequence = itertools.count()
+        # Bumped whenever posts or comments are folded in; cached charts are keyed on them.
+        self.posts_version = 0
+        self.comments_version = 0
+
+        self.posts_count = 0
+        self.post_upvotes_sum = 0
+        self.post_comments_sum = 0
+        self.post_flags = Counter()
+        self.post_authors = SpaceSaving() if approximate else Counter()
+        self.users = HyperLogLog() if approximate else None
+        self.post_hours = Counter()
+        self.post_dates = Counter()
+        self.post_heatmap = Counter()
+        self.account_ages = Counter()
+        self.author_age_sum = CountMin() if approximate else Counter()
+        self.author_age_count = CountMin() if approximate else Counter()
+        self.top_posts_upvotes = TopK(k)
+        self.top_posts_engagement = TopK(k)
+
+        self.comments_count = 0
+        self.comment_upvotes_sum = 0
+        self.comment_authors = SpaceSaving() if approximate else Counter()
+        self.comment_hours = Counter()
+        self.comment_dates = Counter()
+        self.comment_heatmap = Counter()
+        self.top_comments_upvotes = TopK(k)
+        self.velocity = VelocityRollup()
+
+    def add_posts(self, df_posts):
+        if df_posts.empty:
+            return self
+        self.posts_version += 1
+        self.posts_count += len(df_posts)
+        self.post_upvotes_sum += int(df_posts["upvotes"].sum())
+        self.post_comments_sum += int(df_posts["num_comments"].sum())
+        for column in ["has_link", "over_18", "spoiler", "locked", "gilded"]:
+            self.post_flags[column] += int(df_posts[column].sum())
+
+        post_authors = counts(df_posts["author"].dropna())
+        self.post_authors.update(post_authors)
+        if self.users is not None:
+            self.users.update(post_authors)
+        self.post_hours.update(counts(df_posts["created_hour"]))
+        self.post_dates.update(counts(df_posts["created_date"]))
+        self.post_heatmap.update(counts(df_posts[["created_date", "created_hour"]]))
+        self.velocity.add_posts(df_posts["id"], seconds(df_posts["created_at"]))
+
+        ages = df_posts[["author", "account_age_days"]].dropna()
+        self.account_ages.update(counts(ages["account_age_days"]))
+        by_author = ages.groupby("author", observed=True)["account_age_days"].agg(["sum", "count"])
+        self.author_age_sum.update(by_author["sum"].to_dict())
+        self.author_age_count.update(by_author["count"].to_dict())
+
+        # Only each batch's own top k can make the running top k, so the heaps see at most k rows per batch.
+        for row in df_posts.iloc[top_k_indices(df_posts["upvotes"].to_numpy(), self.k)].itertuples():
+            self.top_posts_upvotes.push(
+                row.upvotes, next(self._sequence),
+                {"title": row.title, "author": row.author, "upvotes": row.upvotes, "num_comments": row.num_comments}
+            )
+        for row in df_posts.iloc[top_k_indices(df_posts["engagement_score"].to_numpy(), self.k)].itertuples():
+            self.top_posts_engagement.push(
+                row.engagement_score, next(self._sequence),
+                {"title": row.title, "author": row.author, "engagement": row.engagement_score}
+            )
+        return self
+
+    def add_comments(self, df_comments):
+        if df_comments.empty:
+            return self
+        self.comments_version += 1
+        self.comments_count += len(df_comments)
+        self.comment_upvotes_sum += int(df_comments["comment_upvotes"].sum())
+        comment_authors = counts(df_comments["comment_author"].dropna())
+        self.comment_authors.update(comment_authors)
+        if self.users is not None:
+            self.users.update(comment_authors)
+        self.comment_hours.update(counts(df_comments["comment_created_hour"]))
+        self.comment_dates.update(counts(df_comments["comment_created_date"]))
+        self.comment_heatmap.update(counts(df_comments[["comment_created_date", "comment_created_hour"]]))
+        self.velocity.add_comments(df_comments["post_id"], seconds(df_comments["comment_created_at"]))
+
+        top = top_rows(
+            df_comments, "comment_upvotes", ["comment_author", "comment_upvotes"], self.k,
+            self.excluded_comment_authors, "comment_author"
+        )
+        for row in top.itertuples():
+            self.top_comments_upvotes.push(
+                row.comment_upvotes, next(self._sequence),
+                {"comment_author": row.comment_author, "comment_upvotes": row.comment_upvotes}
+            )
+        return self
+
+    def merge(self, other):
+        self.posts_version += other.posts_version
+        self.comments_version += other.comments_version
+        for name in ["posts_count", "post_upvotes_sum", "post_comments_sum", "comments_count", "comment_upvotes_sum"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ["post_flags", "post_authors", "post_hours", "post_dates", "post_heatmap", "account_ages",
+                     "author_age_sum", "author_age_count", "comment_authors", "comment_hours", "comment_dates",
+                     "comment_heatmap"]:
+            getattr(self, name).update(getattr(other, name))
+        for name in ["top_posts_upvotes", "top_posts_engagement", "top_comments_upvotes"]:
+            getattr(self, name).merge(getattr(other, name))
+        if self.users is not None:
+            self.users.update(other.users)
+        self.velocity.merge(other.velocity)
+        return self
+
+    def stats(self):
+        start_date = min(self.post_dates) if self.post_dates else None
+        end_date = max(self.post_dates) if self.post_dates else None
+        if self.users is not None:
+            unique_users = self.users.count()
+        else:
+            unique_users = len(self.post_authors.keys() | self.comment_authors.keys())
+        return self.posts_count, self.comments_count, start_date, end_date, unique_users
+
+    def post_summary(self):
+        return {
+            "total_posts": self.posts_count,
+            "avg_upvotes": round(self.post_upvotes_sum / self.posts_count, 2) if self.posts_count else float("nan"),
+            "avg_comments": round(self.post_comments_sum / self.posts_count, 2) if self.posts_count else float("nan"),
+            "link_posts": self.post_flags["has_link"],
+            "nsfw_posts": self.post_flags["over_18"],
+            "spoiler_posts": self.post_flags["spoiler"],
+            "locked_posts": self.post_flags["locked"],
+            "gilded_posts": self.post_flags["gilded"]
+        }
+
+    def comment_summary(self):
+        avg_upvotes = (
+            round(self.comment_upvotes_sum / self.comments_count, 2) if self.comments_count else float("nan")
+        )
+        return {
+            "total_comments": self.comments_count,
+            "avg_upvotes": avg_upvotes,
+            "top_authors": dict(top_counts(self.comment_authors, self.k, self.excluded_commenters)),
+            "comments_per_date": self._series(self.comment_dates, "comment_created_date"),
+            "comments_per_hour": self._series(self.comment_hours, "comment_created_hour")
+        }
+
+    def activity(self):
+        post_hours = self._frame(self.post_hours, "hour")
+        post_days = self._frame(self.post_dates, "date")
+        comment_hours = self._frame(self.comment_hours, "hour")
+        return post_hours, post_days, comment_hours
+
+    def user_insights(self, new_threshold_days=30):
+        ranked = top_counts(self.post_authors + self.comment_authors, self.k)
+        most_active_users = pd.Series(dict(ranked), name="count", dtype="int64")
+
+        age_count = sum(self.author_age_count[author] for author, _ in ranked)
+        age_sum = sum(self.author_age_sum[author] for author, _ in ranked)
+        avg_account_age = int(age_sum / age_count) if age_count else None
+
+        new_accounts = sum(count for age, count in self.account_ages.items() if age <= new_threshold_days)
+        total_accounts = sum(self.account_ages.values())
+        new_account_percentage = round((new_accounts / total_accounts) * 100, 2) if total_accounts else 0
+
+        return most_active_users, avg_account_age, new_account_percentage
+
+    def top_performers(self):
+        top_posts_upvotes = pd.DataFrame(
+            self.top_posts_upvotes.rows(), columns=["title", "author", "upvotes", "num_comments"]
+        )
+        top_posts_engagement = pd.DataFrame(self.top_posts_engagement.rows(), columns=["title", "author", "engagement"])
+        top_comments_upvotes = pd.DataFrame(
+            self.top_comments_upvotes.rows(), columns=["comment_author", "comment_upvotes"]
+        )
+        return top_posts_upvotes, top_posts_engagement, top_comments_upvotes
+
+    def heatmap(self, kind="comments"):
+        counts = self.comment_heatmap if kind == "comments" else self.post_heatmap
+        return pd.DataFrame(
+            [(date, hour, count) for (date, hour), count in sorted(counts.items())],
+            columns=["date", "hour", "count"]
+        )
+
+    def _series(self, counts, index_name):
+        series = pd.Series(dict(sorted(counts.items())), name="count", dtype="int64")
+        series.index.name = index_name
+        return series
+
+    def _frame(self, counts, key):
+        return pd.DataFrame(sorted(counts.items()), columns=[key, "count"])
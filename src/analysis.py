@@ -0,0 +1,451 @@
+import datetime
+import json
+import math
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from helper import activity_analysis, activity_heatmap
+from src.aggregate import AggregateState
+from src.columnar import comment_schema, comments_to_batch, concat_batches, filter_post_ids
+from src.fetch import days_to_fetch, fetch_recent_posts, iter_comment_batches, max_posts, window_start
+from src.metrics import Metrics, metrics
+from src.preprocess import add_time_columns, preprocesscomments, preprocessposts
+from src.terms import TermIndex
+from src.threads import thread_structure
+from src.velocity import bucket_sizes, default_bucket
+
+top_words = 20
+
+
+def credentials_from_env():
+    # Reads CLIENT_ID/CLIENT_SECRET/USER_AGENT from the environment, or a .env file next to the app.
+    load_dotenv()
+    return os.environ.get("CLIENT_ID"), os.environ.get("CLIENT_SECRET"), os.environ.get("USER_AGENT")
+
+
+def to_jsonable(value):
+    if isinstance(value, pd.DataFrame):
+        return [to_jsonable(row) for row in value.to_dict(orient="records")]
+    if isinstance(value, pd.Series):
+        return {str(to_jsonable(key)): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, dict):
+        return {str(to_jsonable(key)): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, (pd.Timestamp, datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class Report:
+    def __init__(self, subreddit_name, subscribers, df_posts, state, terms, window_days=days_to_fetch):
+        self.subreddit_name = subreddit_name
+        self.subscribers = subscribers
+        self.window_days = window_days
+        self.df_posts = df_posts
+        self.df_comments = None
+        self.state = state
+        self.terms = terms
+        self.coverage = None
+        self.complete = False
+        self.run_metrics = None
+        self.generated_at = datetime.datetime.now(datetime.timezone.utc)
+        self._memo = {}
+
+    @property
+    def posts_count(self):
+        return self.state.posts_count
+
+    @property
+    def comments_count(self):
+        return self.state.comments_count
+
+    def data_version(self, kind="posts"):
+        # Identifies the data behind a chart or table: post-only ones keep their version while comments
+        # stream in; "all" covers both.
+        versions = {"posts": self.state.posts_version, "comments": self.state.comments_version}
+        version = versions.get(kind, f"{versions['posts']}.{versions['comments']}")
+        return f"{self.generated_at.timestamp():.6f}:{kind}:{version}"
+
+    def _memoized(self, name, kind, build):
+        # Computed once per data version, however often the app or a writer asks for it.
+        version = self.data_version(kind)
+        cached = self._memo.get(name)
+        if cached is None or cached[0] != version:
+            self._memo[name] = (version, build())
+        return self._memo[name][1]
+
+    def comment_summary(self):
+        return self._memoized("comment_summary", "comments", self.state.comment_summary)
+
+    def user_insights(self):
+        return self._memoized("user_insights", "all", self.state.user_insights)
+
+    def top_performers(self):
+        return self._memoized("top_performers", "all", self.state.top_performers)
+
+    def thread_structure(self):
+        # Needs the comment rows, so it is only there once the report is complete.
+        if self.df_comments is None:
+            return None
+        return self._memoized(
+            "thread_structure", "all", lambda: thread_structure(self.df_comments, self.df_posts, self.state.k)
+        )
+
+    def velocity_curve(self, bucket=default_bucket):
+        return self._memoized(f"velocity_curve.{bucket}", "all", lambda: self.state.velocity.curve(bucket))
+
+    def fastest_posts(self, bucket=default_bucket):
+        # Posts with the highest peak comment rate, with their titles from the post frame.
+        def build():
+            fastest = self.state.velocity.fastest_posts(bucket, self.state.k)
+            titles = self.df_posts.drop_duplicates("id").set_index("id")["title"]
+            fastest.insert(1, "title", fastest["post_id"].map(titles))
+            return fastest
+
+        return self._memoized(f"fastest_posts.{bucket}", "all", build)
+
+    def chart_data(self, kind="posts"):
+        # The aggregated series behind every chart, shared by the bar/line variants of the same series.
+        def build():
+            if kind == "posts":
+                post_hours, post_days, _ = self.state.activity()
+                return {
+                    "post_types": self.post_types(),
+                    "post_hours": post_hours,
+                    "post_days": post_days,
+                    "post_heatmap": self.state.heatmap("posts"),
+                    "common_words": self.common_words()
+                }
+            if kind == "velocity":
+                return {f"velocity.{bucket}": self.velocity_curve(bucket) for bucket in bucket_sizes}
+            comment_summary = self.comment_summary()
+            return {
+                "comments_per_date": comment_summary["comments_per_date"],
+                "comments_per_hour": comment_summary["comments_per_hour"],
+                "comment_heatmap": self.state.heatmap("comments")
+            }
+
+        return self._memoized(f"chart_data.{kind}", kind, build)
+
+    def post_types(self):
+        post_types = self.df_posts["post_type"].value_counts()
+        post_types = post_types[post_types > 0].reset_index()
+        post_types.columns = ["post_type", "count"]
+        return post_types
+
+    def common_words(self, top_n=top_words):
+        return self.terms.most_common(top_n)
+
+    def sections(self):
+        posts_count, comments_count, start_date, end_date, unique_users = self.state.stats()
+        post_hours, post_days, comment_hours = self.state.activity()
+        most_active_users, avg_account_age, new_account_percentage = self.user_insights()
+        top_posts_upvotes, top_posts_engagement, top_comments_upvotes = self.top_performers()
+        return {
+            "subreddit": self.subreddit_name,
+            "subscribers": self.subscribers,
+            "window_days": self.window_days,
+            "generated_at": self.generated_at,
+            "complete": self.complete,
+            "approximate": self.state.approximate,
+            "coverage": self.coverage,
+            "stats": {
+                "posts_count": posts_count,
+                "comments_count": comments_count,
+                "start_date": start_date,
+                "end_date": end_date,
+                "unique_users": unique_users
+            },
+            "post_summary": self.state.post_summary(),
+            "post_types": self.post_types(),
+            "comment_summary": self.comment_summary(),
+            "activity": {"post_hours": post_hours, "post_days": post_days, "comment_hours": comment_hours},
+            "user_insights": {
+                "most_active_users": most_active_users,
+                "avg_account_age": avg_account_age,
+                "new_account_percentage": new_account_percentage
+            },
+            "top_performers": {
+                "top_posts_upvotes": top_posts_upvotes,
+                "top_posts_engagement": top_posts_engagement,
+                "top_comments_upvotes": top_comments_upvotes
+            },
+            "heatmaps": {"posts": self.state.heatmap("posts"), "comments": self.state.heatmap("comments")},
+            "thread_structure": self.thread_structure(),
+            "velocity": {
+                "curves": {bucket: self.velocity_curve(bucket) for bucket in bucket_sizes},
+                "fastest_posts": self.fastest_posts()
+            },
+            "common_words": self.common_words(),
+            "run": self.run_metrics
+        }
+
+    def summary_row(self):
+        # One flat row per subreddit for the cross-subreddit comparison table.
+        posts_count, comments_count, start_date, end_date, unique_users = self.state.stats()
+        post_summary = self.state.post_summary()
+        comment_summary = self.comment_summary()
+        _, _, new_account_percentage = self.user_insights()
+        top_word = self.common_words(1)
+        threads = self.thread_structure()
+        return {
+            "subreddit": self.subreddit_name,
+            "subscribers": self.subscribers,
+            "posts": posts_count,
+            "comments": comments_count,
+            "unique_users": unique_users,
+            "avg_post_upvotes": post_summary["avg_upvotes"],
+            "avg_comments_per_post": post_summary["avg_comments"],
+            "avg_comment_upvotes": comment_summary["avg_upvotes"],
+            "link_posts": post_summary["link_posts"],
+            "nsfw_posts": post_summary["nsfw_posts"],
+            "new_account_percentage": new_account_percentage,
+            "peak_post_hour": max(self.state.post_hours, key=self.state.post_hours.get, default=None),
+            "peak_comment_hour": max(self.state.comment_hours, key=self.state.comment_hours.get, default=None),
+            "top_word": top_word["Word"].iloc[0] if len(top_word) else None,
+            "comment_coverage": self.coverage["coverage"] if self.coverage else None,
+            "failed_threads": len(self.coverage.get("failed_posts", [])) if self.coverage else 0,
+            "max_thread_depth": threads["max_depth"] if threads else None,
+            "median_reply_latency": threads["reply_latency"]["p50"] if threads else None
+        }
+
+    def to_dict(self):
+        return to_jsonable(self.sections())
+
+    def write(self, out_dir, format="json"):
+        with metrics.span("report.write"):
+            return self._write(out_dir, format)
+
+    def _write(self, out_dir, format):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        name = self.subreddit_name.lower()
+        paths = [out_dir / f"{name}.json"]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+        if format == "parquet":
+            # The summary stays JSON; the row-level frames and chart tables go to Parquet next to it.
+            table_dir = out_dir / name
+            table_dir.mkdir(exist_ok=True)
+            sections = self.sections()
+            tables = {
+                "posts": self.df_posts,
+                "comments": self.df_comments,
+                "post_types": sections["post_types"],
+                "common_words": sections["common_words"],
+                "post_heatmap": sections["heatmaps"]["posts"],
+                "comment_heatmap": sections["heatmaps"]["comments"],
+                **sections["top_performers"]
+            }
+            tables["fastest_posts"] = sections["velocity"]["fastest_posts"]
+            for bucket, curve in sections["velocity"]["curves"].items():
+                tables[f"velocity_{bucket}"] = curve
+            if sections["thread_structure"]:
+                tables["top_reply_edges"] = sections["thread_structure"]["top_reply_edges"]
+            for table_name, df in tables.items():
+                if df is not None:
+                    df.to_parquet(table_dir / f"{table_name}.parquet", index=False)
+                    paths.append(table_dir / f"{table_name}.parquet")
+        return paths
+
+
+def aggregate(state, df_posts=None, df_comments=None):
+    rows = (0 if df_posts is None else len(df_posts)) + (0 if df_comments is None else len(df_comments))
+    with metrics.span("analysis.aggregate", rows=rows):
+        if df_posts is not None:
+            state.add_posts(df_posts)
+        if df_comments is not None:
+            state.add_comments(df_comments)
+    return state
+
+
+def index_terms(df_posts, approximate=False):
+    with metrics.span("analysis.terms", rows=len(df_posts)):
+        return TermIndex(approximate=approximate).add_posts(df_posts)
+
+
+def build_report(subreddit_name, subscribers, posts, comments, coverage=None, window_days=days_to_fetch,
+                 fetch_metrics=None, approximate=False):
+    # The CPU side of the pipeline on already-fetched data; comments may be dicts or Arrow batches.
+    # fetch_metrics is the run report of the fetch, folded into this report's run section.
+    # approximate swaps the per-author and per-word counters for sketches (see AggregateState).
+    since = metrics.snapshot()
+    df_posts = preprocessposts(posts)
+    df_comments = preprocesscomments(comments)
+    report = Report(
+        subreddit_name, subscribers, df_posts, aggregate(AggregateState(approximate=approximate), df_posts, df_comments),
+        index_terms(df_posts, approximate), window_days
+    )
+    report.df_comments = df_comments
+    report.coverage = coverage
+    report.complete = True
+
+    run = Metrics()
+    if fetch_metrics:
+        run.merge(fetch_metrics)
+    run.merge(metrics.report(since))
+    report.run_metrics = run.report()
+    return report
+
+
+class ThreadInsight:
+    def __init__(self, reddit, store=None, limiter=None, comment_time_budget=None, partitions=None, checkpoints=None,
+                 approximate=False):
+        self.reddit = reddit
+        self.store = store
+        self.limiter = limiter
+        self.comment_time_budget = comment_time_budget
+        self.partitions = partitions
+        self.checkpoints = checkpoints
+        self.approximate = approximate
+
+    def _history(self, subreddit_name, days):
+        # Sealed day partitions at the start of the window are read back; only the rest is fetched.
+        # With partitions the fetch may start at the midnight before the window so a finished first day can seal;
+        # those earlier posts only get their comments once every post in the window has them.
+        start = window_start(days)
+        if not self.partitions:
+            return start, start, [], None
+        since = self.partitions.resume_from(subreddit_name, start)
+        if since <= start:
+            return start, since, [], None
+        with metrics.span("partitions.read") as span:
+            posts, comments = self.partitions.read_posts(subreddit_name, start, since)
+            span["rows"] = len(posts) + comments.num_rows
+        return start, since, posts, comments
+
+    def _posts(self, subreddit_name, since, max_posts):
+        # A checkpointed job that an earlier run didn't finish carries on with the same posts, so only
+        # the threads it is missing are fetched.
+        job = self.checkpoints.job(subreddit_name, since, max_posts) if self.checkpoints else None
+        if job is not None and job.started:
+            metrics.inc("fetch_resumed")
+            return job.posts, job.subscribers, job.until, job
+        until = time.time()
+        posts, subscribers = fetch_recent_posts(
+            subreddit_name, self.reddit, self.store, self.limiter, max_posts=max_posts, since=since
+        )
+        if job is not None:
+            job.start(posts, subscribers, until, since)
+        return posts, subscribers, until, job
+
+    def _save(self, subreddit_name, posts, comment_batches, coverage, since, until, max_posts, job=None):
+        # Threads that failed or were cut off keep their days unsealed and the job's checkpoint around.
+        incomplete = bool(coverage and not coverage["complete"])
+        if self.partitions:
+            with metrics.span("partitions.write", rows=len(posts)):
+                self.partitions.write(
+                    subreddit_name, posts, concat_batches(comment_batches, comment_schema), since, until,
+                    truncated=incomplete, capped=len(posts) >= max_posts
+                )
+        if job is not None and not incomplete:
+            job.discard()
+
+    def stream(self, subreddit_name, days=days_to_fetch, max_posts=max_posts):
+        # Yields the same Report object as it fills in: once with posts, then after every comment batch,
+        # and a final time with complete=True and the full comment frame attached.
+        run_start = time.perf_counter()
+        snapshot = metrics.snapshot()
+        start, since, history_posts, history_comments = self._history(subreddit_name, days)
+        posts, subscribers, until, job = self._posts(subreddit_name, since, max_posts)
+        window_posts = [post for post in posts if post["created_utc"] >= start]
+        df_posts = preprocessposts(window_posts + history_posts)
+        report = Report(
+            subreddit_name, subscribers, df_posts, aggregate(AggregateState(approximate=self.approximate), df_posts),
+            index_terms(df_posts, self.approximate),
+            window_days=days
+        )
+        if df_posts.empty:
+            if job is not None:
+                job.discard()
+            report.df_comments = preprocesscomments(comments_to_batch([]))
+            report.complete = True
+            report.run_metrics = metrics.report(since=snapshot)
+            yield report
+            return
+        yield report
+
+        comment_batches = []
+        if history_comments is not None:
+            comment_batches.extend(history_comments.to_batches())
+            aggregate(report.state, df_comments=preprocesscomments(history_comments))
+
+        new_batches = []
+        coverage = None
+        for batch, coverage in iter_comment_batches(posts, self.reddit, self.store, self.limiter,
+                                                    time_budget=self.comment_time_budget, as_arrow=True,
+                                                    checkpoint=job, window_start=start):
+            new_batches.append(batch)
+            if len(window_posts) < len(posts):
+                batch = filter_post_ids(batch, [post["id"] for post in window_posts])
+            comment_batches.append(batch)
+            aggregate(report.state, df_comments=preprocesscomments(batch))
+            report.coverage = coverage
+            yield report
+
+        self._save(subreddit_name, posts, new_batches, coverage, since, until, max_posts, job)
+        report.df_comments = preprocesscomments(concat_batches(comment_batches, comment_schema))
+        report.complete = True
+        metrics.add_span("run", time.perf_counter() - run_start, report.posts_count + report.comments_count)
+        report.run_metrics = metrics.report(since=snapshot)
+        yield report
+
+    def fetch(self, subreddit_name, days=days_to_fetch, max_posts=max_posts):
+        start, since, history_posts, history_comments = self._history(subreddit_name, days)
+        posts, subscribers, until, job = self._posts(subreddit_name, since, max_posts)
+        window_posts = [post for post in posts if post["created_utc"] >= start]
+        new_batches = []
+        coverage = None
+        if posts:
+            for batch, coverage in iter_comment_batches(posts, self.reddit, self.store, self.limiter,
+                                                        time_budget=self.comment_time_budget, as_arrow=True,
+                                                        checkpoint=job, window_start=start):
+                new_batches.append(batch)
+        self._save(subreddit_name, posts, new_batches, coverage, since, until, max_posts, job)
+
+        comment_batches = history_comments.to_batches() if history_comments is not None else []
+        comments = concat_batches(comment_batches + new_batches, comment_schema)
+        if len(window_posts) < len(posts):
+            comments = filter_post_ids(comments, [post["id"] for post in window_posts + history_posts])
+        return window_posts + history_posts, subscribers, comments, coverage
+
+    def analyze(self, subreddit_name, days=days_to_fetch, max_posts=max_posts):
+        for report in self.stream(subreddit_name, days, max_posts):
+            pass
+        return report
+
+    def analyze_many(self, subreddit_names, days=days_to_fetch, max_posts=max_posts):
+        return {subreddit_name: self.analyze(subreddit_name, days, max_posts) for subreddit_name in subreddit_names}
+
+    def activity(self, subreddit_name, days=days_to_fetch):
+        # Activity charts and heatmaps straight from the stored partitions: only the days in the window
+        # are opened and only the timestamp columns are read.
+        if self.partitions is None:
+            raise ValueError(
+                "activity() reads stored partitions; create ThreadInsight with partitions=PartitionStore()."
+            )
+        start = window_start(days)
+        with metrics.span("analysis.activity") as span:
+            posts, comments = self.partitions.read(
+                subreddit_name, start, post_columns=["created_utc"], comment_columns=["comment_created_utc"]
+            )
+            span["rows"] = posts.num_rows + comments.num_rows
+            df_posts = add_time_columns(posts.to_pandas(), "created_utc", "created")
+            df_comments = add_time_columns(comments.to_pandas(), "comment_created_utc", "comment_created")
+            post_hours, post_days, comment_hours = activity_analysis(df_posts, df_comments)
+            return {
+                "post_hours": post_hours,
+                "post_days": post_days,
+                "comment_hours": comment_hours,
+                "post_heatmap": activity_heatmap(df_posts, "created"),
+                "comment_heatmap": activity_heatmap(df_comments, "comment_created")
+            }
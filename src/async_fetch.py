@@ -0,0 +1,131 @@
+import asyncio
+from src.authors import resolve_author_created_async, unique_author_ids
+from src.fetch import (
+    build_comment_record, build_post_record, comment_attempts, days_to_fetch, get_account_age_days, max_posts,
+    window_start
+)
+from src.metrics import metrics
+from src.ratelimit import TokenBucket, backoff_async, follow_rate_limit_headers, throttle_async
+from src.source import comment_to_dict, post_to_dict
+
+max_concurrency = 16
+listing_page_size = 100
+
+
+async def fetch_recent_posts_async(subreddit_name, reddit, limiter, days=days_to_fetch, max_posts=max_posts):
+    import asyncprawcore
+
+    try:
+        with metrics.span("fetch.subreddit"):
+            await throttle_async(limiter)
+            subreddit_instance = await reddit.subreddit(subreddit_name, fetch=True)
+    except (asyncprawcore.exceptions.NotFound, asyncprawcore.exceptions.Redirect):
+        raise ValueError(f"Subreddit '{subreddit_name}' does not exist.")
+    except asyncprawcore.exceptions.Forbidden:
+        raise ValueError(f"Subreddit '{subreddit_name}' is private, banned or quarantined.")
+
+    start_timestamp = window_start(days)
+
+    post_list = []
+    with metrics.span("fetch.listing") as span:
+        async for post in subreddit_instance.new(limit=max_posts):
+            if len(post_list) % listing_page_size == 0:
+                await throttle_async(limiter)
+            if post.created_utc < start_timestamp:
+                break
+            post_list.append(post)
+        span["rows"] = len(post_list)
+
+    post_list = [post_to_dict(post) for post in post_list]
+    with metrics.span("fetch.authors") as span:
+        author_ids = unique_author_ids(post_list)
+        author_created = await resolve_author_created_async(author_ids, reddit, limiter)
+        span["rows"] = len(author_ids)
+    all_posts = [
+        build_post_record(post, get_account_age_days(author_created.get(post["author_fullname"])))
+        for post in post_list
+    ]
+    all_posts.sort(key=lambda x: x["created_utc"], reverse=True)
+
+    return all_posts, subreddit_instance.subscribers
+
+
+async def fetch_comments_async(posts, reddit, limiter, concurrency=max_concurrency):
+    # Like iter_comment_batches, a thread that raises is retried after the others, up to comment_attempts
+    # times, and listed in the coverage's failed_posts if it never comes back.
+    import asyncpraw
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = {}
+    requests_used = 0
+
+    async def fetch_comments(post_id):
+        nonlocal requests_used
+        backoff_time = 2
+        async with semaphore:
+            while True:
+                try:
+                    await throttle_async(limiter)
+                    requests_used += 1
+                    with metrics.span("fetch.comments") as span:
+                        submission = await reddit.submission(post_id)
+                        await submission.comments.replace_more(limit=0)
+                        comments = [
+                            build_comment_record(comment_to_dict(comment), post_id)
+                            for comment in submission.comments.list()
+                        ]
+                        span["rows"] = len(comments)
+                except Exception as e:
+                    if isinstance(e, asyncpraw.exceptions.RedditAPIException) and "RATELIMIT" in str(e):
+                        backoff_time = await backoff_async(backoff_time, "comments")
+                        continue
+                    metrics.inc("comment_fetch_errors", error=type(e).__name__)
+                    failed[post_id] = f"{type(e).__name__}: {e}"
+                    return None
+                failed.pop(post_id, None)
+                return comments
+
+    fetched = {}
+    pending = list(posts)
+    for attempt in range(comment_attempts):
+        if attempt:
+            metrics.inc("retries", len(pending), stage="comments")
+        results = await asyncio.gather(*(fetch_comments(post["id"]) for post in pending))
+        fetched.update((post["id"], comments) for post, comments in zip(pending, results) if comments is not None)
+        pending = [post for post in pending if post["id"] not in fetched]
+        if not pending:
+            break
+
+    all_comments = [comment for post in posts for comment in fetched.get(post["id"], [])]
+    comments_expected = sum(post["num_comments"] for post in posts)
+    coverage = {
+        "posts_total": len(posts),
+        "posts_fetched": len(fetched),
+        "comments_expected": comments_expected,
+        "comments_fetched": len(all_comments),
+        "coverage": round(min(len(all_comments) / comments_expected, 1.0), 4) if comments_expected else 1.0,
+        "requests": requests_used,
+        "truncated": False,
+        "failed_posts": sorted(failed),
+        "complete": not failed
+    }
+    return all_comments, coverage
+
+
+def fetch_subreddit_async(subreddit_name, client_id, client_secret, user_agent, limiter=None,
+                          concurrency=max_concurrency, days=days_to_fetch, max_posts=max_posts):
+    try:
+        import asyncpraw
+    except ImportError:
+        raise ImportError("The async engine needs asyncpraw: pip install -r requirements.txt") from None
+
+    limiter = limiter or TokenBucket()
+
+    async def run():
+        async with asyncpraw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent) as reddit:
+            follow_rate_limit_headers(reddit, limiter)
+            posts, subscribers = await fetch_recent_posts_async(subreddit_name, reddit, limiter, days, max_posts)
+            comments, coverage = await fetch_comments_async(posts, reddit, limiter, concurrency)
+        return posts, subscribers, comments, coverage
+
+    return asyncio.run(run())
@@ -0,0 +1,102 @@
+import threading
+from cachetools import TTLCache
+from src.ratelimit import backoff, backoff_async, throttle, throttle_async
+from src.source import RateLimitError
+
+author_cache_ttl = 24 * 60 * 60
+author_cache_size = 200000
+author_batch_size = 100
+
+_missing = object()
+
+
+class AuthorCache:
+    # Shared by every subreddit and session in the process; account creation dates never change,
+    # so the TTL only bounds how long suspended or deleted accounts stay negatively cached.
+    def __init__(self, maxsize=author_cache_size, ttl=author_cache_ttl):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, fullnames):
+        found = {}
+        missing = []
+        with self._lock:
+            for fullname in fullnames:
+                created_utc = self._cache.get(fullname, _missing)
+                if created_utc is _missing:
+                    missing.append(fullname)
+                else:
+                    found[fullname] = created_utc
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, created):
+        with self._lock:
+            for fullname, created_utc in created.items():
+                self._cache[fullname] = created_utc
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+author_cache = AuthorCache()
+
+
+def unique_author_ids(posts):
+    return list(dict.fromkeys(post["author_fullname"] for post in posts if post.get("author_fullname")))
+
+
+def resolve_author_created(fullnames, reddit, cache=author_cache, limiter=None):
+    created, missing = cache.get_many(fullnames)
+
+    for start in range(0, len(missing), author_batch_size):
+        batch = missing[start:start + author_batch_size]
+        backoff_time = 1
+        while True:
+            try:
+                throttle(limiter, reddit)
+                authors = reddit.authors_by_ids(batch)
+                break
+            except RateLimitError:
+                backoff_time = backoff(backoff_time, "authors")
+
+        # Ids missing from the response belong to suspended or deleted accounts; cache them as None too.
+        resolved = {fullname: authors[fullname]["created_utc"] if fullname in authors else None for fullname in batch}
+        cache.put_many(resolved)
+        created.update(resolved)
+
+    return created
+
+
+async def resolve_author_created_async(fullnames, reddit, limiter, cache=author_cache):
+    import asyncpraw
+
+    created, missing = cache.get_many(fullnames)
+
+    for start in range(0, len(missing), author_batch_size):
+        batch = missing[start:start + author_batch_size]
+        backoff_time = 1
+        while True:
+            try:
+                await throttle_async(limiter)
+                authors = {
+                    author.fullname: getattr(author, "created_utc", None)
+                    async for author in reddit.redditors.partial_redditors(batch)
+                }
+                break
+            except asyncpraw.exceptions.RedditAPIException as e:
+                if "RATELIMIT" not in str(e):
+                    raise
+                backoff_time = await backoff_async(backoff_time, "authors")
+        resolved = {fullname: authors.get(fullname) for fullname in batch}
+        cache.put_many(resolved)
+        created.update(resolved)
+
+    return created
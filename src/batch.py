@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+import pandas as pd
+import praw
+import prawcore
+from src.analysis import ThreadInsight, build_report
+from src.fetch import days_to_fetch, max_posts
+from src.metrics import metrics
+from src.sketches import HyperLogLog, sketch_from_bytes
+
+analysis_workers = os.cpu_count() or 1
+# Fetched subreddits waiting for a free worker, per worker; bounds how much raw data sits in memory.
+pending_per_worker = 2
+
+
+def analyze_fetched(subreddit_name, subscribers, posts, comments, coverage, out_dir=None, format="json",
+                    days=days_to_fetch, fetch_metrics=None, approximate=False):
+    # Runs in a worker process: reports are written there so only the summary row travels back, along
+    # with the worker's metrics for the parent to fold into its own and, in approximate mode, the
+    # serialized unique-users sketch for the count across the whole batch.
+    snapshot = metrics.snapshot()
+    report = build_report(subreddit_name, subscribers, posts, comments, coverage, days, fetch_metrics, approximate)
+    if out_dir:
+        report.write(out_dir, format)
+    users = report.state.users.to_bytes() if approximate else None
+    return report.summary_row(), metrics.report(since=snapshot), users
+
+
+def run_batch(subreddit_names, reddit, store=None, limiter=None, out_dir=None, format="json",
+              comment_time_budget=None, workers=analysis_workers, days=days_to_fetch, max_posts=max_posts,
+              partitions=None, checkpoints=None, approximate=False):
+    # Fetching stays in this process so every subreddit shares one client, rate limiter and author
+    # cache; preprocessing and analysis go to the pool while the next subreddit is being fetched.
+    insight = ThreadInsight(reddit, store, limiter, comment_time_budget, partitions, checkpoints, approximate)
+    rows = []
+    failures = {}
+    users = HyperLogLog() if approximate else None
+
+    def collect(futures, return_when):
+        done, _ = wait(futures, return_when=return_when)
+        for future in done:
+            subreddit_name = futures.pop(future)
+            try:
+                row, worker_metrics, worker_users = future.result()
+                rows.append(row)
+                metrics.merge(worker_metrics)
+                if worker_users is not None:
+                    users.update(sketch_from_bytes(worker_users))
+            except Exception as e:
+                failures[subreddit_name] = f"analysis failed: {e}"
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for subreddit_name in subreddit_names:
+            snapshot = metrics.snapshot()
+            try:
+                posts, subscribers, comments, coverage = insight.fetch(subreddit_name, days, max_posts)
+            except ValueError as e:
+                failures[subreddit_name] = str(e)
+                continue
+            except (prawcore.exceptions.PrawcoreException, praw.exceptions.PRAWException) as e:
+                # A private or banned subreddit, or a network error, costs that subreddit, not the batch.
+                failures[subreddit_name] = f"fetch failed: {type(e).__name__}: {e}"
+                continue
+            if not posts:
+                failures[subreddit_name] = "no posts in the time window"
+                continue
+
+            futures[pool.submit(analyze_fetched, subreddit_name, subscribers, posts, comments, coverage,
+                                out_dir, format, days, metrics.report(since=snapshot), approximate)] = subreddit_name
+            if len(futures) >= workers * pending_per_worker:
+                collect(futures, FIRST_COMPLETED)
+
+        if futures:
+            collect(futures, ALL_COMPLETED)
+
+    comparison = pd.DataFrame(rows)
+    if not comparison.empty:
+        comparison = comparison.sort_values("subreddit").reset_index(drop=True)
+    if users is not None:
+        # Users active in any of the subreddits, each counted once.
+        comparison.attrs["unique_users_total"] = users.count()
+    if out_dir:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        comparison.to_csv(Path(out_dir) / "comparison.csv", index=False)
+    return comparison, failures
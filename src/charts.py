@@ -0,0 +1,164 @@
+import io
+import threading
+from cachetools import LRUCache
+
+figure_cache_size = 512
+
+
+class FigureCache:
+    # Serialized figures (Plotly JSON, word-cloud PNG bytes) shared by every session in the process.
+    # Keys carry the report's data version, so a changed dataset never hits an old entry. Plotly and
+    # wordcloud are imported by the builders, on the first chart that needs them, not with this module.
+    def __init__(self, maxsize=figure_cache_size):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build()
+        with self._lock:
+            self._cache[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+figure_cache = FigureCache()
+
+
+def bar(x, y, labels=None, title=None):
+    import plotly.express as px
+
+    return px.bar(x=x, y=y, labels=labels, title=title, color_discrete_sequence=['#003366'])
+
+
+def line(x, y, labels=None, title=None):
+    import plotly.express as px
+
+    return px.line(x=x, y=y, labels=labels, title=title, line_shape='linear', markers=True)
+
+
+def heatmap(grouped, label):
+    import plotly.express as px
+
+    return px.density_heatmap(
+        grouped,
+        x="hour",
+        y="date",
+        z="count",
+        color_continuous_scale="Blues",
+        labels={'hour': 'Hour of Day', 'date': 'Date', 'count': label},
+        nbinsx=24
+    )
+
+
+def post_types_chart(data):
+    import plotly.express as px
+
+    return px.pie(
+        data["post_types"],
+        names='post_type',
+        values='count',
+        title='Post Types Distribution',
+        color_discrete_sequence=['#003366']
+    )
+
+
+def common_words_chart(data):
+    import plotly.express as px
+
+    fig = px.bar(
+        data["common_words"],
+        x='Frequency',
+        y='Word',
+        orientation='h',
+        title='Top 20 Most Common Words in Posts',
+        color='Frequency',
+        color_continuous_scale='Blues',
+        labels={'Frequency': 'Frequency', 'Word': 'Word'}
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+
+def series_chart(kind, series_name, label, title=None):
+    def build(data):
+        series = data[series_name]
+        if hasattr(series, "columns"):
+            x, y = series.iloc[:, 0], series["count"]
+        else:
+            x, y = series.index, series.values
+        return kind(x, y, labels={"x": label, "y": "Frequency"}, title=title)
+    return build
+
+
+def velocity_chart(bucket):
+    def build(data):
+        curve = data[f"velocity.{bucket}"]
+        return line(
+            curve["hours_since_post"], curve["comments_per_post_hour"],
+            labels={"x": "Hours Since Posting", "y": "Comments per Post per Hour"},
+            title=f"Comment Velocity ({bucket} buckets)"
+        )
+    return build
+
+
+# name: (data kind the chart depends on, builder over Report.chart_data(kind))
+charts = {
+    "post_types": ("posts", post_types_chart),
+    "post_hours.bar": ("posts", series_chart(bar, "post_hours", "Hour", "Post Frequency by Hour")),
+    "post_hours.line": ("posts", series_chart(line, "post_hours", "Hour", "Post Frequency by Hour (Line Chart)")),
+    "post_days.bar": ("posts", series_chart(bar, "post_days", "Date", "Posts per Day")),
+    "post_days.line": ("posts", series_chart(line, "post_days", "Date", "Posts per Day (Line Chart)")),
+    "post_heatmap": ("posts", lambda data: heatmap(data["post_heatmap"], "Post Count")),
+    "common_words": ("posts", common_words_chart),
+    "comments_per_date.bar": ("comments", series_chart(bar, "comments_per_date", "Date")),
+    "comments_per_date.line": ("comments", series_chart(line, "comments_per_date", "Date")),
+    "comments_per_hour.bar": ("comments", series_chart(bar, "comments_per_hour", "Hour")),
+    "comments_per_hour.line": ("comments", series_chart(line, "comments_per_hour", "Hour")),
+    "comment_heatmap": ("comments", lambda data: heatmap(data["comment_heatmap"], "Comment Count")),
+    "velocity.5min": ("velocity", velocity_chart("5min")),
+    "velocity.1h": ("velocity", velocity_chart("1h")),
+    "velocity.1d": ("velocity", velocity_chart("1d"))
+}
+
+
+def cache_key(report, name, kind):
+    return (report.subreddit_name.lower(), report.window_days, report.data_version(kind), name)
+
+
+def figure_json(report, name):
+    kind, build = charts[name]
+    return figure_cache.get_or_build(cache_key(report, name, kind), lambda: build(report.chart_data(kind)).to_json())
+
+
+def figure(report, name):
+    import plotly.io as pio
+
+    return pio.from_json(figure_json(report, name))
+
+
+def word_cloud_png(report):
+    def build():
+        import wordcloud
+
+        cloud = wordcloud.WordCloud(
+            width=1000,
+            height=500,
+            background_color='black',
+            colormap='Blues'
+        ).generate_from_frequencies(report.terms.frequencies)
+        buffer = io.BytesIO()
+        cloud.to_image().save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    return figure_cache.get_or_build(cache_key(report, "word_cloud", "posts"), build)
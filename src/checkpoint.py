@@ -0,0 +1,141 @@
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+import pyarrow as pa
+from src.columnar import comment_schema, concat_batches, merge_batches
+
+checkpoint_path = "threadinsight_jobs"
+checkpoint_ttl = 60 * 60  # an unfinished job older than this starts over with a fresh listing
+checkpoint_every = 50  # completed threads between flushes to disk
+
+
+class FetchCheckpoint:
+    # One fetch job on disk: <path>/job.json holds the post list, the threads already done and the
+    # threads that failed with their attempt counts; comments-<n>.arrow files hold the finished threads'
+    # comments, one file per flush. A job that dies, or a session that restarts, picks up from here.
+    def __init__(self, path, every=checkpoint_every):
+        self.path = Path(path)
+        self.every = every
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_ids = []
+        self.job = self._load()
+
+    def _load(self):
+        path = self.path / "job.json"
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.path / "job.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.job, f)
+        tmp.replace(path)
+
+    @property
+    def started(self):
+        return self.job is not None
+
+    @property
+    def posts(self):
+        return self.job["posts"]
+
+    @property
+    def subscribers(self):
+        return self.job["subscribers"]
+
+    @property
+    def until(self):
+        return self.job["until"]
+
+    def start(self, posts, subscribers, until, since=None):
+        with self._lock:
+            self.job = {
+                "created_at": time.time(), "since": since, "until": until, "posts": posts,
+                "subscribers": subscribers, "done": [], "failed": {}, "files": []
+            }
+            self._save()
+
+    def done_ids(self):
+        return set(self.job["done"]) if self.job else set()
+
+    def failed(self):
+        # post id -> {"attempts": n, "error": "..."} for threads that have not succeeded yet; attempts
+        # add up across resumes.
+        return dict(self.job["failed"]) if self.job else {}
+
+    def comments(self):
+        batches = []
+        for name in self.job["files"] if self.job else []:
+            with pa.ipc.open_file(self.path / name) as reader:
+                batches.extend(reader.get_batch(i) for i in range(reader.num_record_batches))
+        return merge_batches(batches, comment_schema)
+
+    def add(self, post_id, comments):
+        with self._lock:
+            self._pending.append(comments)
+            self._pending_ids.append(post_id)
+            if len(self._pending_ids) >= self.every:
+                self._flush()
+
+    def fail(self, post_id, error):
+        with self._lock:
+            failure = self.job["failed"].setdefault(post_id, {"attempts": 0})
+            failure["attempts"] += 1
+            failure["error"] = f"{type(error).__name__}: {error}"
+            self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self.job is None:
+            return
+        if self._pending:
+            # Comments first, then the manifest naming them: a crash in between leaves an unused file,
+            # never a thread marked done without its comments.
+            name = f"comments-{len(self.job['files']):05d}.arrow"
+            # IPC files allow one dictionary per column, so the threads' dictionaries are unified first.
+            table = concat_batches(self._pending, comment_schema)
+            with pa.ipc.new_file(self.path / name, comment_schema) as writer:
+                writer.write_table(table)
+            self.job["files"].append(name)
+            self.job["done"].extend(self._pending_ids)
+            for post_id in self._pending_ids:
+                self.job["failed"].pop(post_id, None)
+            self._pending = []
+            self._pending_ids = []
+        self._save()
+
+    def discard(self):
+        with self._lock:
+            self.job = None
+            self._pending = []
+            self._pending_ids = []
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class CheckpointStore:
+    def __init__(self, path=checkpoint_path, ttl=checkpoint_ttl, every=checkpoint_every):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.every = every
+
+    def job(self, subreddit_name, since, max_posts):
+        # One job per subreddit and post cap. A rerun finds it as long as its window starts within the
+        # TTL of the job's (without stored partitions the start moves with the clock); a different
+        # window or an expired job starts over.
+        checkpoint = FetchCheckpoint(self.path / f"{subreddit_name.lower()}-{max_posts}", self.every)
+        if checkpoint.started and (
+            time.time() - checkpoint.job["created_at"] > self.ttl
+            or abs(since - (checkpoint.job["since"] or 0)) > self.ttl
+        ):
+            checkpoint.discard()
+        return checkpoint
@@ -0,0 +1,136 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pandas as pd
+
+# Authors, post types and parent ids repeat heavily, so they are dictionary-encoded and arrive in
+# pandas as categoricals; free text stays in Arrow buffers as string[pyarrow] instead of Python objects.
+labels = pa.dictionary(pa.int32(), pa.string())
+
+post_schema = pa.schema([
+    ("id", pa.string()),
+    ("author", labels),
+    ("title", pa.string()),
+    ("selftext", pa.string()),
+    ("is_self", pa.bool_()),
+    ("num_comments", pa.int64()),
+    ("over_18", pa.bool_()),
+    ("spoiler", pa.bool_()),
+    ("locked", pa.bool_()),
+    ("gilded", pa.int64()),
+    ("upvotes", pa.int64()),
+    ("created_utc", pa.float64()),
+    ("post_type", labels),
+    ("account_age_days", pa.float64()),
+])
+
+comment_schema = pa.schema([
+    ("comment_id", pa.string()),
+    ("comment_author", labels),
+    ("comment_upvotes", pa.int64()),
+    ("comment_created_utc", pa.float64()),
+    ("post_id", labels),
+    # Reddit fullname of what the comment replies to: t3_<post id> at the top level, t1_<comment id> below.
+    ("parent_id", labels),
+    ("depth", pa.int64()),
+])
+
+pandas_types = {pa.string(): pd.StringDtype("pyarrow")}
+
+
+class ColumnBuffer:
+    # Preallocated per-column arrays that fetch code appends rows into, so records go straight from the
+    # response JSON into columns without a dict or model object per row. Grows by doubling if the
+    # capacity guess (e.g. a post's num_comments) was short.
+    numpy_types = {pa.int64(): np.int64, pa.float64(): np.float64, pa.bool_(): np.bool_}
+
+    def __init__(self, schema, capacity=1024):
+        self.schema = schema
+        self.length = 0
+        self.columns = [
+            np.empty(max(capacity, 1), dtype=self.numpy_types.get(field.type, object)) for field in schema
+        ]
+
+    def __len__(self):
+        return self.length
+
+    def _grow(self):
+        self.columns = [np.resize(column, len(column) * 2) for column in self.columns]
+
+    def append(self, row):
+        if self.length == len(self.columns[0]):
+            self._grow()
+        for column, value in zip(self.columns, row):
+            column[self.length] = value
+        self.length += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def clear(self):
+        self.length = 0
+
+    def to_batch(self):
+        arrays = []
+        for field, column in zip(self.schema, self.columns):
+            values = column[:self.length]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def posts_to_batch(posts):
+    return pa.RecordBatch.from_pylist(posts, schema=post_schema)
+
+
+def comments_to_batch(comments):
+    return pa.RecordBatch.from_pylist(comments, schema=comment_schema)
+
+
+def to_frame(records, schema):
+    if not isinstance(records, (pa.RecordBatch, pa.Table)):
+        records = pa.RecordBatch.from_pylist(list(records), schema=schema)
+    return records.to_pandas(types_mapper=pandas_types.get)
+
+
+def conform(batch, schema):
+    # Batches stored before a column was added (cached threads, checkpoints, old partitions) get it as nulls.
+    if batch.schema.equals(schema):
+        return batch
+    names = batch.schema.names
+    return pa.RecordBatch.from_arrays([
+        batch.column(names.index(field.name)) if field.name in names else pa.nulls(batch.num_rows, field.type)
+        for field in schema
+    ], schema=schema)
+
+
+def concat_batches(batches, schema):
+    # Dictionaries differ per batch; unify them so the combined table keeps a single category set.
+    return pa.Table.from_batches([conform(batch, schema) for batch in batches], schema=schema).unify_dictionaries()
+
+
+def merge_batches(batches, schema):
+    # One record batch out of several, e.g. every cached thread of a subreddit.
+    table = concat_batches(batches, schema).combine_chunks()
+    return table.to_batches()[0] if table.num_rows else pa.RecordBatch.from_pylist([], schema=schema)
+
+
+def batch_to_bytes(batch):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def batch_from_bytes(data):
+    return pa.ipc.open_stream(data).read_next_batch()
+
+
+def filter_post_ids(comments, post_ids):
+    # Keeps the comments (record batch or table) whose post_id is in post_ids.
+    post_ids = pa.array(list(post_ids), pa.string())
+    return comments.filter(pc.is_in(comments.column("post_id").cast(pa.string()), value_set=post_ids))
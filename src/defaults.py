@@ -0,0 +1,5 @@
+# Window and budget defaults shared by the fetch code, the CLI and the app's form. This module imports
+# nothing, so the app can draw its landing page without loading praw, pandas or pyarrow.
+days_to_fetch = 3
+max_posts = 500
+comment_time_budget = 90
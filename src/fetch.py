@@ -1,142 +1,355 @@
 import time
 import praw
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-import prawcore
+from collections import Counter
+from src.authors import resolve_author_created, unique_author_ids
+from src.columnar import ColumnBuffer, comment_schema, comments_to_batch, filter_post_ids, merge_batches
+from src.defaults import days_to_fetch, max_posts
+from src.metrics import instrument_reddit, metrics
+from src.ratelimit import backoff, throttle
+from src.source import PrawSource, RateLimitError, ReplaySource
 
-days_to_fetch = 3
-max_posts = 500
-post_workers = 2
 comment_workers = 3
+comments_per_request = 200
+comment_attempts = 3
 
 
-def create_reddit_instance(client_id, client_secret, user_agent):
-    return praw.Reddit(
-        client_id=client_id,
-        client_secret=client_secret,
-        user_agent=user_agent
-    )
+def create_reddit_instance(client_id=None, client_secret=None, user_agent=None, backend="praw", **options):
+    if backend == "praw":
+        return PrawSource(instrument_reddit(praw.Reddit(
+            client_id=client_id,
+            client_secret=client_secret,
+            user_agent=user_agent
+        )))
+    if backend == "replay":
+        return ReplaySource(options.pop("fixtures"), **options)
+    raise ValueError(f"Unknown data source backend '{backend}'.")
 
 
-def fetch_recent_posts(subreddit_name, reddit):
+def retry_ratelimited(func, stage, backoff_time=1):
+    while True:
+        try:
+            return func()
+        except RateLimitError:
+            backoff_time = backoff(backoff_time, stage)
+
+
+def refresh_posts(posts, reddit):
+    latest = {
+        post["id"]: post
+        for post in retry_ratelimited(lambda: list(reddit.posts_info([post["id"] for post in posts])), "refresh")
+    }
+    for post in posts:
+        current = latest.get(post["id"])
+        if current:
+            post["num_comments"] = current["num_comments"]
+            post["upvotes"] = current["score"]
+            post["locked"] = current["locked"]
+            post["gilded"] = current["gilded"]
+            post["over_18"] = current["over_18"]
+            post["spoiler"] = current["spoiler"]
+    return posts
+
+
+def get_post_type(url):
+    if url.endswith((".jpg", ".png", ".gif", ".jpeg")):
+        return "Image"
+    if "v.redd.it" in url:
+        return "Video"
+    return "Text"
+
+
+def get_account_age_days(created_utc):
+    if created_utc is None:
+        return None
+    return (datetime.now(timezone.utc) - datetime.fromtimestamp(created_utc, tz=timezone.utc)).days
+
+
+def build_post_record(post, account_age_days):
+    return {
+        "id": post["id"],
+        "author": post["author"],
+        "title": post["title"],
+        "selftext": post["selftext"],
+        "is_self": post["is_self"],
+        "num_comments": post["num_comments"],
+        "over_18": post["over_18"],
+        "spoiler": post["spoiler"],
+        "locked": post["locked"],
+        "gilded": post["gilded"],
+        "upvotes": post["score"],
+        "created_utc": post["created_utc"],
+        "post_type": get_post_type(post["url"]),
+        "account_age_days": account_age_days
+    }
+
+
+def build_comment_record(comment, post_id):
+    return {
+        "comment_id": comment["id"],
+        "comment_author": comment["author"],
+        "comment_upvotes": comment["score"],
+        "comment_created_utc": comment["created_utc"],
+        "post_id": post_id,
+        "parent_id": comment.get("parent_id") or f"t3_{post_id}",
+        "depth": comment.get("depth", 0)
+    }
+
+
+def window_start(days=days_to_fetch):
+    return int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp())
+
+
+def fetch_recent_posts(subreddit_name, reddit, store=None, limiter=None, days=days_to_fetch, max_posts=max_posts,
+                       since=None):
     all_posts = []
 
-    try:
-        subreddit_instance = reddit.subreddit(subreddit_name)
-        subreddit_instance.id
-    except prawcore.exceptions.NotFound:
-        raise ValueError(f"Subreddit '{subreddit_name}' does not exist.")
+    # since overrides days, e.g. to fetch only the part of a window that isn't stored yet.
+    start_timestamp = int(since) if since is not None else window_start(days)
 
-    start_time = datetime.now(timezone.utc) - timedelta(days=days_to_fetch)
-    start_timestamp = int(start_time.timestamp())
+    cached = store.subreddit(subreddit_name) if store else None
+    if cached and cached["since"] > start_timestamp:
+        # The cache holds a shorter window; its newest post would stop the listing before reaching the older ones.
+        cached = None
+    cached_posts = store.get_posts(subreddit_name, since=start_timestamp) if cached else []
+    cached_ids = {post["id"] for post in cached_posts}
 
     post_list = []
     backoff_time = 1
 
-    subscribers = subreddit_instance.subscribers
-    time.sleep(1)
+    if cached:
+        subscribers = cached["subscribers"]
+    else:
+        with metrics.span("fetch.subreddit"):
+            throttle(limiter, reddit)
+            subscribers = reddit.subreddit(subreddit_name)["subscribers"]
+        if not limiter:
+            metrics.record_sleep("courtesy", 1)
+            time.sleep(1)
 
     while True:
         try:
-            for post in subreddit_instance.new(limit=max_posts):
-                if post.created_utc < start_timestamp:
-                    break
-                post_list.append(post)
-
-            post_list.sort(key=lambda x: x.created_utc, reverse=True)
+            with metrics.span("fetch.listing") as span:
+                post_list = []
+                throttle(limiter, reddit)
+                for post in reddit.new_posts(subreddit_name, limit=max_posts):
+                    # The listing is newest-first, so the first cached post marks the end of the new ones.
+                    if post["created_utc"] < start_timestamp or post["id"] in cached_ids:
+                        break
+                    post_list.append(post)
+                span["rows"] = len(post_list)
             break
 
-        except praw.exceptions.APIException as e:
-            if "RATELIMIT" in str(e):
-                time.sleep(backoff_time)
-                backoff_time *= 2
-            else:
-                raise e
+        except RateLimitError:
+            backoff_time = backoff(backoff_time, "listing")
+
+    # New posts push the oldest cached ones out of the max_posts newest; only the cached posts kept are refreshed.
+    cached_posts = cached_posts[:max(max_posts - len(post_list), 0)]
+
+    # One batched lookup per 100 distinct authors instead of a lazy /about request per post.
+    with metrics.span("fetch.authors") as span:
+        author_ids = unique_author_ids(post_list)
+        author_created = resolve_author_created(author_ids, reddit, limiter=limiter)
+        span["rows"] = len(author_ids)
+    for post in post_list:
+        all_posts.append(build_post_record(post, get_account_age_days(author_created.get(post.get("author_fullname")))))
+
+    if cached_posts:
+        with metrics.span("fetch.refresh", rows=len(cached_posts)):
+            throttle(limiter, reddit)
+            all_posts.extend(refresh_posts(cached_posts, reddit))
+    all_posts.sort(key=lambda x: x["created_utc"], reverse=True)
+
+    if store:
+        # A cached subscriber count keeps its fetch time, so the entry still expires after the TTL.
+        store.put_posts(subreddit_name, all_posts, subscribers, since=start_timestamp, fetched=not cached)
+
+    return all_posts, subscribers
 
-    def process_post(post):
-        post_type = "Text"
-        if post.url.endswith((".jpg", ".png", ".gif", ".jpeg")):
-            post_type = "Image"
-        elif "v.redd.it" in post.url:
-            post_type = "Video"
 
+def fetch_comments(post_id, reddit, limiter=None, more_limit=0, max_depth=None, expected=0):
+    # Returns the thread as an Arrow record batch. Rows go from the source straight into column buffers
+    # sized for the comments the requests can return, so a megathread never exists as a list of objects.
+    # Rate limits are waited out here; any other error is raised for the caller to record.
+    buffer = ColumnBuffer(comment_schema, min(expected, comments_per_request * (1 + more_limit)))
+    backoff_time = 2
+    while True:
         try:
-            account_age_days = (
-                (datetime.now(timezone.utc) - datetime.fromtimestamp(post.author.created_utc, tz=timezone.utc)).days
-                if post.author and hasattr(post.author, "created_utc")
-                else None
-            )
-        except:
-            account_age_days = None
+            throttle(limiter, reddit)
+            with metrics.span("fetch.comments") as span:
+                buffer.clear()
+                for comment_id, author, score, created_utc, parent_id, depth in reddit.comment_rows(
+                    post_id, more_limit=more_limit, max_depth=max_depth
+                ):
+                    buffer.append((comment_id, author, score, created_utc, post_id, parent_id, depth))
+                span["rows"] = len(buffer)
+            return buffer.to_batch()
+
+        except RateLimitError:
+            backoff_time = backoff(backoff_time, "comments")
+
 
+def iter_comment_batches(posts, reddit, store=None, limiter=None, time_budget=None, request_budget=None,
+                         more_limit=0, max_depth=None, as_arrow=False, checkpoint=None, window_start=None):
+    # Comments stay in Arrow record batches throughout; without as_arrow each batch is handed over as
+    # a list of comment records instead.
+    # Threads that raise are retried after the others, up to comment_attempts times per run, and listed
+    # in the coverage's failed_posts until they succeed. With a checkpoint (src/checkpoint.py), finished
+    # threads are saved as they arrive and a resumed job only fetches the threads it doesn't hold yet.
+    # Posts created before window_start are only there to complete a partition day: they are fetched after
+    # every window post and left out of the coverage numbers, which only complete reports on.
+    def to_batch(batch):
+        return batch if as_arrow else batch.to_pylist()
+
+    deadline = time.monotonic() + time_budget if time_budget else None
+    requests_used = 0
+    comments_fetched = 0
+    fetched_posts = 0
+    truncated = False
+    failed = {}
+    attempts = Counter()
+    window_ids = {post["id"] for post in posts if window_start is None or post["created_utc"] >= window_start}
+    window_posts = [post for post in posts if post["id"] in window_ids]
+
+    def request_cost(post):
+        # One request for the first page of the tree plus one per MoreComments stub it can expand.
+        return 1 + min(more_limit, post["num_comments"] // comments_per_request)
+
+    def coverage():
+        comments_expected = sum(post["num_comments"] for post in window_posts)
         return {
-            "id": post.id,
-            "author": post.author.name if post.author else "[deleted]",
-            "title": post.title,
-            "selftext": post.selftext,
-            "is_self": post.is_self,
-            "num_comments": post.num_comments,
-            "over_18": post.over_18,
-            "spoiler": post.spoiler,
-            "locked": post.locked,
-            "gilded": post.gilded,
-            "upvotes": post.score,
-            "created_utc": post.created_utc,
-            "post_type": post_type,
-            "account_age_days": account_age_days
+            "posts_total": len(window_posts),
+            "posts_fetched": fetched_posts,
+            "comments_expected": comments_expected,
+            "comments_fetched": comments_fetched,
+            "coverage": round(min(comments_fetched / comments_expected, 1.0), 4) if comments_expected else 1.0,
+            "requests": requests_used,
+            "truncated": truncated and fetched_posts < len(window_posts),
+            "failed_posts": sorted(post_id for post_id in failed if post_id in window_ids),
+            "complete": not truncated and not failed
         }
 
-    with ThreadPoolExecutor(max_workers=post_workers) as executor:
-        futures = [executor.submit(process_post, post) for post in post_list]
+    done_ids = set()
+    cached_batches = []
+    if checkpoint is not None:
+        if not checkpoint.started:
+            checkpoint.start(posts, None, time.time())
+        post_ids = {post["id"] for post in posts}
+        done_ids = checkpoint.done_ids() & post_ids
+        checkpointed = checkpoint.comments()
+        if len(done_ids) < len(checkpoint.done_ids()):
+            checkpointed = filter_post_ids(checkpointed, done_ids)
+        cached_batches.append(checkpointed)
+        for post_id, failure in checkpoint.failed().items():
+            if post_id in post_ids:
+                failed[post_id] = failure["error"]
 
-        for count, future in enumerate(as_completed(futures), start=1):
-            result = future.result()
-            if result:
-                all_posts.append(result)
+    cached = store.get_comments(post["id"] for post in posts if post["id"] not in done_ids) if store else {}
+    stale_posts = []
+    for post in posts:
+        hit = cached.get(post["id"])
+        if post["id"] in done_ids:
+            fetched_posts += post["id"] in window_ids
+        elif hit and hit[0] == post["num_comments"]:
+            cached_batches.append(hit[1])
+            fetched_posts += post["id"] in window_ids
+        else:
+            stale_posts.append(post)
 
-            if count % 100 == 0:
-                time.sleep(1)
+    cached_comments = merge_batches(cached_batches, comment_schema)
+    if len(window_ids) < len(posts):
+        comments_fetched += filter_post_ids(cached_comments, window_ids).num_rows
+    else:
+        comments_fetched += cached_comments.num_rows
+    yield to_batch(cached_comments), coverage()
 
-    return all_posts, subscribers
+    # Popped from the end, so the biggest threads go first and whatever the budget allows covers
+    # the most comment volume, with the posts before the window after all of those inside it.
+    queue = sorted(stale_posts, key=lambda x: (x["id"] in window_ids, x["num_comments"], x["upvotes"]))
 
+    executor = ThreadPoolExecutor(max_workers=comment_workers)
+    future_to_post = {}
+    count = 0
+    try:
+        while queue or future_to_post:
+            while queue and len(future_to_post) < comment_workers:
+                if request_budget is not None and requests_used + request_cost(queue[-1]) > request_budget:
+                    truncated = True
+                    queue = []
+                    break
+                post = queue.pop()
+                requests_used += request_cost(post)
+                future = executor.submit(
+                    fetch_comments, post["id"], reddit, limiter, more_limit, max_depth, post["num_comments"]
+                )
+                future_to_post[future] = post
 
-def fetch_comments(post_id, reddit):
-    backoff_time = 2
-    while True:
-        try:
-            submission = reddit.submission(id=post_id)
-            submission.comments.replace_more(limit=0)
-
-            comments = []
-            for comment in submission.comments.list():
-                comments.append({
-                    "comment_id": comment.id,
-                    "comment_author": comment.author.name if comment.author else "[deleted]",
-                    "comment_upvotes": comment.score,
-                    "comment_created_utc": comment.created_utc,
-                    "post_id": post_id
-                })
-
-            return comments
-
-        except praw.exceptions.APIException as e:
-            if "RATELIMIT" in str(e):
-                time.sleep(backoff_time)
-                backoff_time *= 2
-            else:
-                return []
-
-
-def fetch_comments_parallel(posts, reddit):
+            if not future_to_post:
+                break
+
+            timeout = max(deadline - time.monotonic(), 0) if deadline else None
+            done, _ = wait(future_to_post, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                truncated = True
+                break
+
+            batches = []
+            for future in done:
+                post = future_to_post.pop(future)
+                try:
+                    comments = future.result()
+                except Exception as e:
+                    # One broken thread shouldn't sink the job: note it and retry it after the others.
+                    metrics.inc("comment_fetch_errors", error=type(e).__name__)
+                    attempts[post["id"]] += 1
+                    failed[post["id"]] = f"{type(e).__name__}: {e}"
+                    if checkpoint is not None:
+                        checkpoint.fail(post["id"], e)
+                    if attempts[post["id"]] < comment_attempts:
+                        metrics.inc("retries", stage="comments")
+                        queue.insert(0, post)
+                    continue
+                batches.append(comments)
+                failed.pop(post["id"], None)
+                if post["id"] in window_ids:
+                    fetched_posts += 1
+                    comments_fetched += comments.num_rows
+                count += 1
+                if checkpoint is not None:
+                    checkpoint.add(post["id"], comments)
+
+                if store and (comments.num_rows or not post["num_comments"]):
+                    store.put_comments(post["id"], post["num_comments"], comments)
+
+                if count % 50 == 0 and not limiter:
+                    pause = min(0.5, max(deadline - time.monotonic(), 0)) if deadline else 0.5
+                    metrics.record_sleep("courtesy", pause)
+                    time.sleep(pause)
+
+            batch = merge_batches(batches, comment_schema)
+            yield to_batch(batch), coverage()
+    finally:
+        # Trees still in flight when the deadline passes finish in the background and are dropped.
+        executor.shutdown(wait=not truncated, cancel_futures=True)
+        if checkpoint is not None:
+            checkpoint.flush()
+
+    if truncated:
+        yield to_batch(comments_to_batch([])), coverage()
+
+
+def fetch_comments_budgeted(posts, reddit, store=None, limiter=None, time_budget=None, request_budget=None,
+                            more_limit=0, max_depth=None, checkpoint=None):
     all_comments = []
-    with ThreadPoolExecutor(max_workers=comment_workers) as executor:
-        future_to_post = {executor.submit(fetch_comments, post["id"], reddit): post["id"] for post in posts}
+    coverage = None
+    for comments, coverage in iter_comment_batches(posts, reddit, store, limiter, time_budget, request_budget,
+                                                   more_limit, max_depth, checkpoint=checkpoint):
+        all_comments.extend(comments)
 
-        for count, future in enumerate(as_completed(future_to_post), start=1):
-            post_id = future_to_post[future]
-            all_comments.extend(future.result())
+    return all_comments, coverage
 
-            if count % 50 == 0:
-                time.sleep(0.5)
 
+def fetch_comments_parallel(posts, reddit, store=None, limiter=None, checkpoint=None):
+    all_comments, _ = fetch_comments_budgeted(posts, reddit, store=store, limiter=limiter, checkpoint=checkpoint)
     return all_comments
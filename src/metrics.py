@@ -0,0 +1,153 @@
+import copy
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+metrics_prefix = "threadinsight"
+
+
+class Metrics:
+    # Process-wide counters and span timings. Values only ever grow, like Prometheus counters; a run's
+    # own numbers are the difference between a snapshot taken at its start and report(since=...).
+    # Runs sharing a process at the same time show up in each other's reports.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.spans = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def record_sleep(self, reason, seconds):
+        if seconds:
+            self.inc("sleeps", reason=reason)
+            self.inc("sleep_seconds", seconds, reason=reason)
+
+    @contextmanager
+    def span(self, name, rows=0):
+        # Set record["rows"] inside the block to get a rows-per-second figure for the stage.
+        record = {"rows": rows}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add_span(name, time.perf_counter() - start, record["rows"])
+
+    def add_span(self, name, seconds, rows=0, calls=1):
+        with self._lock:
+            span = self.spans.setdefault(name, {"calls": 0, "seconds": 0.0, "rows": 0})
+            span["calls"] += calls
+            span["seconds"] += seconds
+            span["rows"] += rows
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": Counter(self.counters), "spans": copy.deepcopy(self.spans)}
+
+    def report(self, since=None):
+        current = self.snapshot()
+        counters = current["counters"]
+        spans = current["spans"]
+        if since:
+            counters.subtract(since["counters"])
+            for name, before in since["spans"].items():
+                if name in spans:
+                    spans[name] = {key: spans[name][key] - before[key] for key in spans[name]}
+
+        report = {"spans": {}, "counters": {}, "sleep_seconds": {}}
+        for name, span in sorted(spans.items()):
+            if not span["calls"]:
+                continue
+            rows_per_second = round(span["rows"] / span["seconds"], 1) if span["rows"] and span["seconds"] else None
+            report["spans"][name] = {
+                "calls": span["calls"],
+                "seconds": round(span["seconds"], 4),
+                "rows": span["rows"],
+                "rows_per_second": rows_per_second
+            }
+        for (name, labels), value in sorted(counters.items()):
+            if not value:
+                continue
+            if name == "sleep_seconds":
+                report["sleep_seconds"][dict(labels)["reason"]] = round(value, 4)
+            else:
+                key = name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+                report["counters"][key] = value
+        return report
+
+    def merge(self, report):
+        # Folds in a report produced elsewhere, e.g. by a worker process.
+        for name, span in report["spans"].items():
+            self.add_span(name, span["seconds"], span["rows"], span["calls"])
+        for key, value in report["counters"].items():
+            name, _, labels = key.partition("{")
+            labels = dict(part.split("=", 1) for part in labels.rstrip("}").split(",")) if labels else {}
+            self.inc(name, value, **labels)
+        for reason, seconds in report["sleep_seconds"].items():
+            self.inc("sleep_seconds", seconds, reason=reason)
+
+    def prometheus(self, prefix=metrics_prefix):
+        current = self.snapshot()
+        lines = []
+
+        def labels_text(labels):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+        by_name = {}
+        for (name, labels), value in current["counters"].items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name, samples in sorted(by_name.items()):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{labels_text(labels)} {value}" for labels, value in sorted(samples))
+
+        for field, suffix in [("seconds", "seconds_total"), ("calls", "calls_total"), ("rows", "rows_total")]:
+            metric = f"{prefix}_span_{suffix}"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(
+                f'{metric}{{span="{name}"}} {span[field]}' for name, span in sorted(current["spans"].items())
+            )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.spans.clear()
+
+
+metrics = Metrics()
+
+
+def instrument_reddit(reddit):
+    # prawcore sends every HTTP request through RateLimiter.call, so wrapping it counts requests by
+    # status, times them, and separates prawcore's own rate-limit sleeps from the rest.
+    cores = {id(core): core for core in (
+        reddit._core, getattr(reddit, "_read_only_core", None), getattr(reddit, "_authorized_core", None)
+    ) if core is not None}
+
+    for core in cores.values():
+        rate_limiter = core._rate_limiter
+
+        def call(request_function, *args, original_call=rate_limiter.call, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = original_call(request_function, *args, **kwargs)
+            except Exception as e:
+                metrics.inc("http_requests", status="error")
+                metrics.inc("http_errors", error=type(e).__name__)
+                raise
+            finally:
+                metrics.add_span("http.request", time.perf_counter() - start)
+            metrics.inc("http_requests", status=response.status_code)
+            return response
+
+        def delay(original_delay=rate_limiter.delay, rate_limiter=rate_limiter):
+            if rate_limiter.next_request_timestamp is not None:
+                metrics.record_sleep("prawcore", max(rate_limiter.next_request_timestamp - time.time(), 0))
+            return original_delay()
+
+        rate_limiter.call = call
+        rate_limiter.delay = delay
+    return reddit
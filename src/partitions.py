@@ -0,0 +1,147 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.columnar import comment_schema, post_schema, posts_to_batch
+
+data_path = "threadinsight_data"
+
+
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).date()
+
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def days_between(start, end):
+    day = day_of(start)
+    while day <= day_of(end):
+        yield day
+        day += timedelta(days=1)
+
+
+class PartitionStore:
+    # One Parquet file per subreddit, kind and UTC day: <path>/<subreddit>/posts/<date>.parquet and
+    # comments/<date>.parquet. Comments are filed under their post's day so a partition holds whole
+    # threads. A day is sealed once it was written after it ended with nothing truncated; sealed days
+    # are read back instead of fetched again.
+    def __init__(self, path=data_path):
+        self.path = Path(path)
+
+    def _dir(self, subreddit_name):
+        return self.path / subreddit_name.lower()
+
+    def _file(self, subreddit_name, kind, day):
+        return self._dir(subreddit_name) / kind / f"{day.isoformat()}.parquet"
+
+    def manifest(self, subreddit_name):
+        path = self._dir(subreddit_name) / "manifest.json"
+        if not path.exists():
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, subreddit_name, manifest):
+        path = self._dir(subreddit_name) / "manifest.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        tmp.replace(path)
+
+    def resume_from(self, subreddit_name, start, end=None):
+        # Start of the first day in [start, end] that isn't sealed; everything before it can be read back.
+        # A partly covered first day that has already ended is fetched from midnight so it can seal as well;
+        # one that hasn't ended can't seal yet, so the fetch starts at start.
+        end = end or time.time()
+        manifest = self.manifest(subreddit_name)
+        for day in days_between(start, end):
+            if not manifest.get(day.isoformat(), {}).get("sealed"):
+                if day_start(day + timedelta(days=1)) > end:
+                    return max(day_start(day), start)
+                return day_start(day)
+        return end
+
+    def write(self, subreddit_name, posts, comments, since, until, truncated=False, capped=False):
+        # posts are post records fetched for [since, until]; comments an Arrow table (or batch) of their comments.
+        posts_by_day = {}
+        for post in posts:
+            posts_by_day.setdefault(day_of(post["created_utc"]), []).append(post)
+
+        first_day = day_of(since)
+        if capped and posts:
+            # The listing ran out before reaching since: days older than the oldest post were never seen
+            # and the oldest day is only partly there.
+            first_day = max(first_day, min(posts_by_day))
+
+        comments = pa.table(comments) if isinstance(comments, pa.RecordBatch) else comments
+        comment_post_ids = comments.column("post_id").cast(pa.string())
+
+        manifest = self.manifest(subreddit_name)
+        for kind in ["posts", "comments"]:
+            (self._dir(subreddit_name) / kind).mkdir(parents=True, exist_ok=True)
+
+        written_at = time.time()
+        for day in days_between(since, until):
+            if day < first_day:
+                continue
+            day_posts = posts_by_day.get(day, [])
+            ids = pa.array([post["id"] for post in day_posts], pa.string())
+            day_comments = comments.filter(pc.is_in(comment_post_ids, value_set=ids))
+            pq.write_table(pa.Table.from_batches([posts_to_batch(day_posts)], schema=post_schema),
+                           self._file(subreddit_name, "posts", day))
+            pq.write_table(day_comments, self._file(subreddit_name, "comments", day))
+
+            covered = day_start(day) >= since and day_start(day + timedelta(days=1)) <= until
+            manifest[day.isoformat()] = {
+                "sealed": covered and not truncated and not (capped and day == first_day),
+                "written_at": written_at,
+                "posts": len(day_posts),
+                "comments": day_comments.num_rows
+            }
+        self._save_manifest(subreddit_name, manifest)
+
+    def read(self, subreddit_name, start, end=None, post_columns=None, comment_columns=None):
+        # Partition pruning: only the day files overlapping [start, end] are opened, and only the
+        # requested columns are decoded. Rows outside the window are then filtered by post time.
+        end = end or time.time()
+        post_tables = []
+        comment_tables = []
+        for day in days_between(start, end):
+            if not self._file(subreddit_name, "posts", day).exists():
+                continue
+            post_tables.append(pq.read_table(
+                self._file(subreddit_name, "posts", day),
+                columns=None if post_columns is None else list(dict.fromkeys(["id", "created_utc", *post_columns]))
+            ))
+            comment_tables.append(pq.read_table(
+                self._file(subreddit_name, "comments", day),
+                columns=None if comment_columns is None else list(dict.fromkeys(["post_id", *comment_columns]))
+            ))
+
+        if not post_tables:
+            posts = post_schema.empty_table()
+            comments = comment_schema.empty_table()
+        else:
+            # Older partitions may predate a schema change; missing columns come back as nulls.
+            posts = pa.concat_tables(post_tables, promote_options="default").unify_dictionaries()
+            comments = pa.concat_tables(comment_tables, promote_options="default").unify_dictionaries()
+
+        created = posts.column("created_utc")
+        posts = posts.filter(pc.and_(pc.greater_equal(created, start), pc.less(created, end)))
+        post_ids = posts.column("id").combine_chunks()
+        comments = comments.filter(pc.is_in(comments.column("post_id").cast(pa.string()), value_set=post_ids))
+
+        if post_columns is not None:
+            posts = posts.select(post_columns)
+        if comment_columns is not None:
+            comments = comments.select(comment_columns)
+        return posts, comments
+
+    def read_posts(self, subreddit_name, start, end=None):
+        posts, comments = self.read(subreddit_name, start, end)
+        return posts.to_pylist(), comments
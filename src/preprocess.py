@@ -1,21 +1,34 @@
+import numpy as np
 import pandas as pd
+from src.columnar import comment_schema, post_schema, to_frame
+from src.metrics import metrics
+
+def add_time_columns(df, column, prefix):
+    # Parse once into typed columns; analyses read hour/day-of-week/date from here instead of re-parsing.
+    timestamps = pd.to_datetime(df[column], unit="s")
+    df[f"{prefix}_at"] = timestamps
+    df[f"{prefix}_date"] = pd.Categorical(timestamps.dt.normalize(), ordered=True)
+    df[f"{prefix}_hour"] = timestamps.dt.hour.astype("int8")
+    df[f"{prefix}_dow"] = timestamps.dt.dayofweek.astype("int8")
+    df.drop(columns = [column], axis = 1, inplace = True)
+    return df
+
+def seconds(timestamps):
+    # Parsed timestamps back to epoch seconds, for arithmetic on plain float arrays.
+    return np.asarray(timestamps, dtype="datetime64[ns]").astype(np.int64) / 1e9
 
 def preprocessposts(posts):
-    df_posts = pd.DataFrame(posts)
-    df_posts["created_utc"] = pd.to_datetime(df_posts["created_utc"], unit="s")
-    df_posts["created_date"] = df_posts["created_utc"].dt.date
-    df_posts["created_time"] = df_posts["created_utc"].dt.time
-    df_posts.drop(columns = ["created_utc"], axis = 1, inplace = True)
-    df_posts["has_link"] = df_posts["selftext"].str.contains(r'http[s]?://', na=False)
-    df_posts["engagement_score"] = df_posts["upvotes"] + df_posts["num_comments"].fillna(0)
+    with metrics.span("preprocess.posts", rows=len(posts)):
+        df_posts = to_frame(posts, post_schema)
+        add_time_columns(df_posts, "created_utc", "created")
+        df_posts["has_link"] = df_posts["selftext"].str.contains(r'http[s]?://', na=False)
+        df_posts["engagement_score"] = df_posts["upvotes"] + df_posts["num_comments"].fillna(0)
 
     return df_posts
 
 def preprocesscomments(comments):
-    df_comments = pd.DataFrame(comments)
-    df_comments["comment_created_utc"] = pd.to_datetime(df_comments["comment_created_utc"], unit="s")
-    df_comments["comment_created_date"] = df_comments["comment_created_utc"].dt.date
-    df_comments["comment_created_time"] = df_comments["comment_created_utc"].dt.time
-    df_comments.drop(columns = ["comment_created_utc"], axis = 1, inplace = True)
+    with metrics.span("preprocess.comments", rows=len(comments)):
+        df_comments = to_frame(comments, comment_schema)
+        add_time_columns(df_comments, "comment_created_utc", "comment_created")
 
     return df_comments
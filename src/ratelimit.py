@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from src.metrics import metrics
+
+# Reddit's OAuth quota is 100 queries per minute per client.
+default_rate = 100 / 60
+default_burst = 10
+
+
+class TokenBucket:
+    def __init__(self, rate=default_rate, capacity=default_burst):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1):
+        # Tokens may go negative: each caller is told how long to wait for its own reservation,
+        # so concurrent callers queue up behind each other instead of racing for the same token.
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def update(self, remaining, reset):
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            # Spread whatever the server says is left evenly over the time until its window resets.
+            self.rate = max(remaining, 1) / max(reset, 1.0)
+            self.tokens = min(self.tokens, remaining)
+
+    def update_from_headers(self, headers):
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is not None and reset is not None:
+            self.update(float(remaining), float(reset))
+
+    def sync(self, source):
+        status = source.rate_limit_status()
+        if status:
+            self.update(status["remaining"], status["reset"])
+
+
+def throttle(limiter, source):
+    # With a limiter the pace follows the API quota and replaces the fixed courtesy sleeps.
+    if limiter:
+        limiter.sync(source)
+        metrics.record_sleep("token_bucket", limiter.acquire())
+
+
+async def throttle_async(limiter):
+    metrics.record_sleep("token_bucket", await limiter.acquire_async())
+
+
+def backoff(backoff_time, stage):
+    # Waits out a RATELIMIT response before the stage tries again; returns the next, doubled wait.
+    metrics.inc("ratelimit_backoffs")
+    metrics.inc("retries", stage=stage)
+    metrics.record_sleep("backoff", backoff_time)
+    time.sleep(backoff_time)
+    return backoff_time * 2
+
+
+async def backoff_async(backoff_time, stage):
+    metrics.inc("ratelimit_backoffs")
+    metrics.inc("retries", stage=stage)
+    metrics.record_sleep("backoff", backoff_time)
+    await asyncio.sleep(backoff_time)
+    return backoff_time * 2
+
+
+def follow_rate_limit_headers(reddit, limiter):
+    # Both prawcore and asyncprawcore feed every response's headers through RateLimiter.update,
+    # so hooking it lets the bucket see X-Ratelimit-Remaining/Reset as soon as they arrive.
+    cores = {id(core): core for core in (
+        reddit._core, getattr(reddit, "_read_only_core", None), getattr(reddit, "_authorized_core", None)
+    ) if core is not None}
+
+    for core in cores.values():
+        rate_limiter = core._rate_limiter
+
+        def update(*args, original_update=rate_limiter.update, **kwargs):
+            headers = kwargs.get("response_headers", args[0] if args else {})
+            limiter.update_from_headers(headers)
+            return original_update(*args, **kwargs)
+
+        rate_limiter.update = update
+    return reddit
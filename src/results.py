@@ -0,0 +1,280 @@
+import pickle
+import threading
+import time
+import uuid
+from cachetools import TTLCache
+from src.metrics import metrics
+
+result_ttl = 15 * 60  # seconds a finished report is served as fresh
+result_stale_ttl = 45 * 60  # further seconds it may be served stale while a refresh runs in the background
+result_cache_bytes = 512 * 1024 * 1024  # estimated memory the in-process cache may hold
+flight_timeout = 15 * 60  # how long a follower waits on someone else's fetch
+lock_poll_interval = 0.5
+
+
+def result_key(subreddit_name, days, max_posts):
+    return f"threadinsight:report:{subreddit_name.lower()}:{days}:{max_posts}"
+
+
+def report_nbytes(report):
+    # An estimate: the two frames dominate, the aggregate counters and term index are small next to them.
+    nbytes = report.df_posts.memory_usage(deep=True).sum()
+    if report.df_comments is not None:
+        nbytes += report.df_comments.memory_usage(deep=True).sum()
+    return int(nbytes)
+
+
+class LocalBackend:
+    # Entries live in this process, evicted by TTL and, past the byte budget, least recently used first.
+    def __init__(self, max_bytes=result_cache_bytes, ttl=result_ttl + result_stale_ttl, sizeof=report_nbytes):
+        self._entries = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=lambda entry: entry[2])
+        self._lock = threading.Lock()
+        self.sizeof = sizeof
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[:2] if entry else None
+
+    def set(self, key, stored_at, value):
+        entry = (stored_at, value, self.sizeof(value))
+        with self._lock:
+            try:
+                self._entries[key] = entry
+            except ValueError:
+                # Larger than the whole budget; serve it to the waiting sessions but don't keep it.
+                self._entries.pop(key, None)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def acquire(self, key, timeout):
+        # Sessions in one process are already deduplicated by ResultCache's own flights.
+        return True
+
+    def release(self, key):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def nbytes(self):
+        return self._entries.currsize
+
+
+class RedisBackend:
+    # Shares reports between processes or hosts through anything speaking redis-py's get/set/delete.
+    # Eviction under memory pressure is left to the server's maxmemory policy; keys expire after
+    # the fresh plus stale window. A SET NX key stops two processes fetching the same report at once.
+    def __init__(self, client, ttl=result_ttl + result_stale_ttl):
+        self.client = client
+        self.ttl = ttl
+        self._tokens = {}
+
+    def get(self, key):
+        payload = self.client.get(key)
+        return pickle.loads(payload) if payload is not None else None
+
+    def set(self, key, stored_at, value):
+        self.client.set(key, pickle.dumps((stored_at, value), protocol=pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def acquire(self, key, timeout):
+        token = uuid.uuid4().hex
+        if self.client.set(f"{key}:lock", token, nx=True, ex=max(int(timeout), 1)):
+            self._tokens[key] = token
+            return True
+        return False
+
+    def locked(self, key):
+        return self.client.get(f"{key}:lock") is not None
+
+    def release(self, key):
+        token = self._tokens.pop(key, None)
+        lock_key = f"{key}:lock"
+        current = self.client.get(lock_key)
+        if token is not None and current is not None and current.decode() == token:
+            self.client.delete(lock_key)
+
+    def clear(self):
+        pass
+
+
+class LocalRedis:
+    # In-memory stand-in for the subset of redis-py RedisBackend uses, for tests and local runs.
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires = self._data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            if isinstance(value, str):
+                value = value.encode()
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    # Finished reports shared by every session, so one popular subreddit is fetched once per TTL
+    # instead of once per viewer. Concurrent misses for a key share one in-flight fetch; past the
+    # TTL a stale report is still returned while a single background refresh replaces it.
+    def __init__(self, backend=None, ttl=result_ttl, stale_ttl=result_stale_ttl, clock=time.time):
+        self.backend = backend or LocalBackend(ttl=ttl + stale_ttl)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        # Returns (value, "fresh" | "stale" | None).
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, None
+        stored_at, value = entry
+        age = self.clock() - stored_at
+        if age < self.ttl:
+            return value, "fresh"
+        if age < self.ttl + self.stale_ttl:
+            return value, "stale"
+        return None, None
+
+    def put(self, key, value):
+        self.backend.set(key, self.clock(), value)
+
+    def invalidate(self, key):
+        self.backend.delete(key)
+
+    def claim(self, key):
+        # Returns (flight, leader). The leader computes and calls resolve(); everyone else wait()s.
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def resolve(self, key, flight, value=None, error=None, store=True):
+        # Waiters are released even if storing fails; they get the value either way.
+        flight.value = value
+        flight.error = error
+        try:
+            if error is None and store:
+                self.put(key, value)
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def wait(self, flight, timeout=flight_timeout):
+        metrics.inc("result_cache", result="wait")
+        if not flight.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for another session's fetch.")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def wait_remote(self, key, timeout=flight_timeout):
+        # Another process holds the backend lock; poll until its report lands or the lock goes away.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value, state = self.lookup(key)
+            if state == "fresh":
+                return value
+            if not getattr(self.backend, "locked", lambda key: False)(key):
+                return None
+            time.sleep(lock_poll_interval)
+        return None
+
+    def get(self, key, refresh=None, timeout=flight_timeout):
+        # A fresh or stale report, or None on a miss. Stale hits start refresh() in the background.
+        value, state = self.lookup(key)
+        metrics.inc("result_cache", result={"fresh": "hit", "stale": "stale"}.get(state, "miss"))
+        if state == "stale" and refresh is not None:
+            self.revalidate(key, refresh, timeout)
+        return value
+
+    def get_or_compute(self, key, compute, timeout=flight_timeout):
+        value = self.get(key, refresh=compute, timeout=timeout)
+        if value is not None:
+            return value
+        flight, leader = self.claim(key)
+        if leader:
+            return self.lead(key, flight, compute, timeout)
+        return self.wait(flight, timeout)
+
+    def lead(self, key, flight, compute, timeout=flight_timeout):
+        try:
+            # A fetch may have finished between the lookup and the claim.
+            value, state = self.lookup(key)
+            computed = state != "fresh"
+            if computed:
+                if self.backend.acquire(key, timeout):
+                    try:
+                        value = compute()
+                    finally:
+                        self.backend.release(key)
+                else:
+                    value = self.wait_remote(key, timeout)
+                    computed = value is None
+                    if computed:
+                        value = compute()
+        except BaseException as e:
+            self.resolve(key, flight, error=e if isinstance(e, Exception) else RuntimeError("Fetch was interrupted."))
+            raise
+        self.resolve(key, flight, value, store=computed)
+        return value
+
+    def revalidate(self, key, compute, timeout=flight_timeout):
+        flight, leader = self.claim(key)
+        if not leader:
+            return flight
+
+        def refresh():
+            try:
+                self.lead(key, flight, compute, timeout)
+            except Exception:
+                # The stale report stays in place until it expires; the next request tries again.
+                metrics.inc("result_cache_refresh_errors")
+
+        threading.Thread(target=refresh, name=f"refresh {key}", daemon=True).start()
+        return flight
+
+
+def create_result_cache(redis_url=None, ttl=result_ttl, stale_ttl=result_stale_ttl):
+    if redis_url:
+        import redis
+
+        backend = RedisBackend(redis.Redis.from_url(redis_url), ttl=ttl + stale_ttl)
+        return ResultCache(backend, ttl=ttl, stale_ttl=stale_ttl)
+    return ResultCache(ttl=ttl, stale_ttl=stale_ttl)
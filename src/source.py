@@ -0,0 +1,523 @@
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from pathlib import Path
+
+import praw
+import prawcore
+from src.metrics import metrics
+
+
+page_size = 100
+
+
+class RateLimitError(Exception):
+    def __init__(self, message="RATELIMIT", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DataSource:
+    # Every backend serves plain dicts shaped like Reddit's listing JSON, so the
+    # fetch layer never has to know whether it is talking to PRAW or a fixture.
+    requests = 0
+
+    def subreddit(self, name):
+        raise NotImplementedError
+
+    def new_posts(self, name, limit):
+        raise NotImplementedError
+
+    def posts_info(self, post_ids):
+        raise NotImplementedError
+
+    def comments(self, post_id, more_limit=0, max_depth=None):
+        raise NotImplementedError
+
+    def comment_rows(self, post_id, more_limit=0, max_depth=None):
+        # (id, author, score, created_utc, parent_id, depth) per comment. Backends that can read these
+        # straight off the response override this to skip building a dict per comment.
+        for comment in self.comments(post_id, more_limit=more_limit, max_depth=max_depth):
+            yield comment_row(comment, post_id)
+
+    def authors_by_ids(self, fullnames):
+        raise NotImplementedError
+
+    def rate_limit_status(self):
+        return None
+
+
+def post_to_dict(post):
+    return {
+        "id": post.id,
+        "author": post.author.name if post.author else "[deleted]",
+        "author_fullname": getattr(post, "author_fullname", None),
+        "title": post.title,
+        "selftext": post.selftext,
+        "is_self": post.is_self,
+        "num_comments": post.num_comments,
+        "over_18": post.over_18,
+        "spoiler": post.spoiler,
+        "locked": post.locked,
+        "gilded": post.gilded,
+        "score": post.score,
+        "created_utc": post.created_utc,
+        "url": post.url,
+    }
+
+
+def comment_to_dict(comment):
+    return {
+        "id": comment.id,
+        "author": comment.author.name if comment.author else "[deleted]",
+        "score": comment.score,
+        "created_utc": comment.created_utc,
+        "parent_id": comment.parent_id,
+        "depth": getattr(comment, "depth", 0),
+    }
+
+
+def comment_row(comment, post_id):
+    # Comments recorded before parent linkage was kept are taken as top-level replies to the post.
+    return (
+        comment["id"], comment["author"], comment["score"], comment["created_utc"],
+        comment.get("parent_id") or f"t3_{post_id}", comment.get("depth", 0)
+    )
+
+
+post_fields = ["id", "author", "author_fullname", "title", "selftext", "is_self", "num_comments", "over_18",
+               "spoiler", "locked", "gilded", "score", "created_utc", "url"]
+
+
+def post_from_json(data):
+    # The "data" object of a t3 listing child; same shape as post_to_dict.
+    post = {field: data.get(field) for field in post_fields}
+    post["author"] = data.get("author") or "[deleted]"
+    return post
+
+
+def comment_rows_from_json(children, max_depth=None, more=None):
+    # Walks a comment listing ("children" of a t1 listing, or morechildren's flat "things") and yields
+    # one row per comment. Children are popped off as they are visited, so the parsed tree is released
+    # while it is read instead of being mirrored as model objects. Ids behind "more" stubs go to more.
+    stack = list(reversed(children))
+    children.clear()
+    while stack:
+        child = stack.pop()
+        data = child["data"]
+        if child["kind"] == "more":
+            if more is not None and data.get("children"):
+                more.extend(data["children"])
+            continue
+        if child["kind"] != "t1":
+            continue
+        if max_depth is None or data.get("depth", 0) <= max_depth:
+            yield (
+                data["id"], data.get("author") or "[deleted]", data["score"], data["created_utc"],
+                data["parent_id"], data.get("depth", 0)
+            )
+        replies = data.get("replies")
+        if replies:
+            stack.extend(reversed(replies["data"]["children"]))
+
+
+class PrawSource(DataSource):
+    def __init__(self, reddit):
+        self.reddit = reddit
+
+    def _rate_limited(self, e):
+        if "RATELIMIT" in str(e):
+            return RateLimitError(str(e))
+        return e
+
+    def subreddit(self, name):
+        # Reddit answers most unknown names with a redirect to its search page rather than a 404.
+        try:
+            subreddit_instance = self.reddit.subreddit(name)
+            subreddit_instance.id
+        except (prawcore.exceptions.NotFound, prawcore.exceptions.Redirect):
+            raise ValueError(f"Subreddit '{name}' does not exist.")
+        except prawcore.exceptions.Forbidden:
+            raise ValueError(f"Subreddit '{name}' is private, banned or quarantined.")
+
+        return {"name": subreddit_instance.display_name, "subscribers": subreddit_instance.subscribers}
+
+    def _get(self, path, params):
+        # Raw listing JSON through PRAW's authenticated, rate-limited session, without turning every
+        # child into a Submission/Comment model.
+        try:
+            return self.reddit.request(method="GET", path=path, params={**params, "raw_json": 1})
+        except praw.exceptions.APIException as e:
+            raise self._rate_limited(e)
+
+    def new_posts(self, name, limit):
+        after = None
+        while limit > 0:
+            listing = self._get(f"r/{name}/new", {"limit": min(limit, page_size), "after": after})["data"]
+            for child in listing["children"]:
+                yield post_from_json(child["data"])
+            limit -= len(listing["children"])
+            after = listing.get("after")
+            if not after or not listing["children"]:
+                break
+
+    def posts_info(self, post_ids):
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), page_size):
+            fullnames = ",".join(f"t3_{post_id}" for post_id in post_ids[start:start + page_size])
+            for child in self._get("api/info", {"id": fullnames})["data"]["children"]:
+                yield post_from_json(child["data"])
+
+    def comments(self, post_id, more_limit=0, max_depth=None):
+        return [
+            {"id": comment_id, "author": author, "score": score, "created_utc": created_utc,
+             "parent_id": parent_id, "depth": depth}
+            for comment_id, author, score, created_utc, parent_id, depth
+            in self.comment_rows(post_id, more_limit, max_depth)
+        ]
+
+    def comment_rows(self, post_id, more_limit=0, max_depth=None):
+        params = {"depth": max_depth + 1} if max_depth is not None else {}
+        more = []
+        yield from comment_rows_from_json(
+            self._get(f"comments/{post_id}", params)[1]["data"]["children"], max_depth, more
+        )
+        # Like replace_more(limit=more_limit): each expansion is one request for up to 100 hidden comments.
+        for _ in range(more_limit):
+            if not more:
+                break
+            children, more = more[:page_size], more[page_size:]
+            things = self._get("api/morechildren", {
+                "api_type": "json", "link_id": f"t3_{post_id}", "children": ",".join(children)
+            })["json"]["data"]["things"]
+            yield from comment_rows_from_json(things, max_depth, more)
+
+    def rate_limit_status(self):
+        rate_limiter = self.reddit._core._rate_limiter
+        if rate_limiter.remaining is None or not rate_limiter.reset_timestamp:
+            return None
+        return {"remaining": rate_limiter.remaining, "reset": rate_limiter.reset_timestamp - time.time()}
+
+    def authors_by_ids(self, fullnames):
+        # Suspended and deleted accounts are simply absent from the response.
+        try:
+            return {
+                author.fullname: {"id": author.fullname, "name": author.name, "created_utc": author.created_utc}
+                for author in self.reddit.redditors.partial_redditors(fullnames)
+                if hasattr(author, "created_utc")
+            }
+        except praw.exceptions.APIException as e:
+            raise self._rate_limited(e)
+
+
+def load_fixtures(path):
+    path = Path(path)
+    files = sorted(path.glob("*.json")) if path.is_dir() else [path]
+    fixtures = {}
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            fixture = json.load(f)
+        fixtures[fixture["name"].lower()] = fixture
+    return fixtures
+
+
+def save_fixture(fixture, path):
+    path = Path(path)
+    if path.is_dir() or not path.suffix:
+        path.mkdir(parents=True, exist_ok=True)
+        path = path / f"{fixture['name'].lower()}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    return path
+
+
+class ReplaySource(DataSource):
+    page_size = page_size
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, rate_limit=None, rate_period=60.0,
+                 on_limit="sleep", comments_per_request=None, seed=None):
+        if not isinstance(fixtures, dict):
+            fixtures = load_fixtures(fixtures)
+        self.fixtures = {name.lower(): fixture for name, fixture in fixtures.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.on_limit = on_limit
+        self.comments_per_request = comments_per_request
+        self.requests = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._post_index = {}
+        self._posts = {}
+        self._authors = {}
+        # Posts and threads are looked up by bare id, as on Reddit, where ids are unique site-wide; two
+        # fixtures sharing an id would serve one subreddit's comments for the other, so that's an error.
+        owners = {}
+        for fixture in self.fixtures.values():
+            for post_id in itertools.chain((post["id"] for post in fixture["posts"]), fixture.get("comments", {})):
+                owner = owners.setdefault(post_id, fixture)
+                if owner is not fixture:
+                    raise ValueError(f"Post id '{post_id}' appears in both r/{owner['name']} and r/{fixture['name']}.")
+            for post in fixture["posts"]:
+                self._posts[post["id"]] = post
+            for post_id in fixture.get("comments", {}):
+                self._post_index[post_id] = fixture
+            for author in fixture.get("authors", {}).values():
+                if author.get("id"):
+                    self._authors[author["id"]] = author
+
+    def _request(self):
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= self.rate_period:
+                    self._window_start = now
+                    self._window_used = 0
+                if self._window_used >= self.rate_limit:
+                    self.rate_limited += 1
+                    wait = self.rate_period - (now - self._window_start)
+                    if self.on_limit == "raise":
+                        metrics.inc("http_requests", status=429)
+                        raise RateLimitError("RATELIMIT: simulated", retry_after=wait)
+                    # Stands in for prawcore waiting out the window before it sends the request.
+                    metrics.record_sleep("prawcore", wait)
+                    time.sleep(wait)
+                    self._window_start = time.monotonic()
+                    self._window_used = 0
+                self._window_used += 1
+            self.requests += 1
+            metrics.inc("http_requests", status=200)
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay:
+            time.sleep(delay)
+        metrics.add_span("http.request", delay)
+
+    def _fixture(self, name):
+        fixture = self.fixtures.get(name.lower())
+        if fixture is None:
+            raise ValueError(f"Subreddit '{name}' does not exist.")
+        return fixture
+
+    def subreddit(self, name):
+        self._request()
+        fixture = self._fixture(name)
+        return {"name": fixture["name"], "subscribers": fixture["subscribers"]}
+
+    def new_posts(self, name, limit):
+        fixture = self._fixture(name)
+        posts = sorted(fixture["posts"], key=lambda x: x["created_utc"], reverse=True)[:max(limit, 0)]
+        for start in range(0, max(len(posts), 1), self.page_size):
+            self._request()
+            for post in posts[start:start + self.page_size]:
+                yield dict(post)
+
+    def posts_info(self, post_ids):
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), self.page_size):
+            self._request()
+            for post_id in post_ids[start:start + self.page_size]:
+                if post_id in self._posts:
+                    yield dict(self._posts[post_id])
+
+    def _thread(self, post_id, more_limit):
+        self._request()
+        fixture = self._post_index.get(post_id)
+        if fixture is None:
+            return []
+        comments = fixture["comments"][post_id]
+        if self.comments_per_request:
+            # Mimic Reddit truncating big trees behind MoreComments stubs that each cost a request to expand.
+            expansions = min(more_limit, (len(comments) - 1) // self.comments_per_request)
+            for _ in range(expansions):
+                self._request()
+            comments = comments[:self.comments_per_request * (expansions + 1)]
+        return comments
+
+    def comments(self, post_id, more_limit=0, max_depth=None):
+        return [dict(comment) for comment in self._thread(post_id, more_limit)]
+
+    def comment_rows(self, post_id, more_limit=0, max_depth=None):
+        return [comment_row(comment, post_id) for comment in self._thread(post_id, more_limit)]
+
+    def authors_by_ids(self, fullnames):
+        fullnames = list(fullnames)
+        authors = {}
+        for start in range(0, len(fullnames), self.page_size):
+            self._request()
+            for fullname in fullnames[start:start + self.page_size]:
+                if fullname in self._authors:
+                    authors[fullname] = dict(self._authors[fullname])
+        return authors
+
+    def rate_limit_status(self):
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            elapsed = time.monotonic() - self._window_start
+            if elapsed >= self.rate_period:
+                return {"remaining": self.rate_limit, "reset": self.rate_period}
+            return {"remaining": self.rate_limit - self._window_used, "reset": self.rate_period - elapsed}
+
+
+class RecordingSource(DataSource):
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+        self.fixtures = {}
+        self._post_subreddit = {}
+        self._author_subreddits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def requests(self):
+        return self.source.requests
+
+    def _fixture(self, name):
+        return self.fixtures.setdefault(
+            name.lower(), {"name": name, "subscribers": 0, "posts": [], "comments": {}, "authors": {}}
+        )
+
+    def subreddit(self, name):
+        info = self.source.subreddit(name)
+        with self._lock:
+            fixture = self._fixture(name)
+            fixture["name"] = info["name"]
+            fixture["subscribers"] = info["subscribers"]
+        return info
+
+    def new_posts(self, name, limit):
+        for post in self.source.new_posts(name, limit):
+            with self._lock:
+                fixture = self._fixture(name)
+                if post["id"] not in self._post_subreddit:
+                    fixture["posts"].append(post)
+                    self._post_subreddit[post["id"]] = name.lower()
+                if post.get("author_fullname"):
+                    self._author_subreddits.setdefault(post["author_fullname"], set()).add(name.lower())
+            yield post
+
+    def posts_info(self, post_ids):
+        return self.source.posts_info(post_ids)
+
+    def comments(self, post_id, more_limit=0, max_depth=None):
+        comments = self.source.comments(post_id, more_limit=more_limit, max_depth=max_depth)
+        with self._lock:
+            name = self._post_subreddit.get(post_id)
+            if name is not None:
+                self.fixtures[name]["comments"][post_id] = comments
+        return comments
+
+    def rate_limit_status(self):
+        return self.source.rate_limit_status()
+
+    def authors_by_ids(self, fullnames):
+        authors = self.source.authors_by_ids(fullnames)
+        # Each account goes into the fixtures of the subreddits it posted in.
+        with self._lock:
+            for fullname, author in authors.items():
+                for name in self._author_subreddits.get(fullname, ()):
+                    self.fixtures[name]["authors"][author["name"]] = author
+        return authors
+
+    def save(self):
+        return [save_fixture(fixture, self.path) for fixture in self.fixtures.values()]
+
+
+def synthetic_fixture(name, n_posts=500, n_comments=10000, days=3, n_authors=None, subscribers=100000,
+                      seed=0, now=None):
+    rng = random.Random(seed)
+    now = int(time.time() if now is None else now)
+    window = days * 86400
+    n_authors = n_authors or max(10, (n_posts + n_comments) // 8)
+    authors = [f"user_{i}" for i in range(n_authors)]
+    author_ids = {author: f"t2_{i:x}" for i, author in enumerate(authors)}
+    # Zipf-like weights so a handful of accounts dominate, as on real subreddits. Cumulative weights are
+    # precomputed; rng.choices would otherwise rebuild them for every pick.
+    author_weights = list(itertools.accumulate(1 / (i + 1) for i in range(n_authors)))
+    special = ["[deleted]", "AutoModerator"]
+
+    def pick_author():
+        if rng.random() < 0.03:
+            return rng.choice(special)
+        return rng.choices(authors, cum_weights=author_weights)[0]
+
+    words = ["python", "data", "help", "question", "project", "code", "learn", "error", "release",
+             "update", "guide", "issue", "today", "best", "first", "new", "using", "build", "test", "idea"]
+    suffixes = (".jpg", ".png", ".gif", "")
+    # Reddit ids are unique site-wide and ReplaySource relies on it, so fixtures replayed together
+    # mustn't share post or comment ids.
+    prefix = f"{name.lower()}_"
+
+    posts = []
+    for i in range(n_posts):
+        created = float(int(now - rng.uniform(0, window)))
+        kind = rng.random()
+        if kind < 0.15:
+            url = f"https://i.redd.it/{i}{rng.choice(suffixes[:3])}"
+        elif kind < 0.25:
+            url = f"https://v.redd.it/{i}"
+        else:
+            url = f"https://www.reddit.com/r/{name}/comments/{prefix}p{i}/"
+        selftext = " ".join(rng.choices(words, k=rng.randint(0, 40)))
+        if rng.random() < 0.1:
+            selftext += " https://example.com"
+        author = pick_author()
+        posts.append({
+            "id": f"{prefix}p{i}",
+            "author": author,
+            "author_fullname": author_ids.get(author),
+            "title": " ".join(rng.choices(words, k=rng.randint(3, 12))),
+            "selftext": selftext,
+            "is_self": kind >= 0.25,
+            "num_comments": 0,
+            "over_18": rng.random() < 0.02,
+            "spoiler": rng.random() < 0.01,
+            "locked": rng.random() < 0.01,
+            "gilded": 1 if rng.random() < 0.005 else 0,
+            "score": int(rng.paretovariate(1.2)) - 1,
+            "created_utc": created,
+            "url": url,
+        })
+
+    comments = {post["id"]: [] for post in posts}
+    if posts:
+        post_weights = [rng.paretovariate(1.1) for _ in posts]
+        for i, post in enumerate(rng.choices(posts, post_weights, k=n_comments)):
+            age = min(now - post["created_utc"], rng.expovariate(1 / 7200))
+            comments[post["id"]].append({
+                "id": f"{prefix}c{i}",
+                "author": pick_author(),
+                "score": int(rng.paretovariate(1.5)) - 1,
+                "created_utc": float(int(post["created_utc"] + age)),
+            })
+    for post in posts:
+        comments[post["id"]].sort(key=lambda x: x["created_utc"])
+        post["num_comments"] = len(comments[post["id"]])
+
+    author_ages = {
+        author: {"id": author_ids[author], "name": author,
+                 "created_utc": now - math.floor(rng.expovariate(1 / 900)) * 86400}
+        for author in authors
+    }
+
+    # Reply trees, drawn last so the other fields stay the same for a given seed: a comment answers the
+    # post or, more often, one of the recent comments before it.
+    for post in posts:
+        thread = comments[post["id"]]
+        for i, comment in enumerate(thread):
+            if i and rng.random() < 0.6:
+                parent = thread[max(0, i - 1 - int(rng.expovariate(1 / 5)))]
+                comment["parent_id"] = f"t1_{parent['id']}"
+                comment["depth"] = parent["depth"] + 1
+            else:
+                comment["parent_id"] = f"t3_{post['id']}"
+                comment["depth"] = 0
+
+    return {"name": name, "subscribers": subscribers, "posts": posts, "comments": comments, "authors": author_ages}
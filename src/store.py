@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import threading
+import time
+from src.columnar import batch_from_bytes, batch_to_bytes, comments_to_batch
+
+cache_path = "threadinsight_cache.sqlite"
+cache_ttl = 6 * 60 * 60
+max_subreddits = 50
+
+
+class PostStore:
+    def __init__(self, path=cache_path, ttl=cache_ttl, max_subreddits=max_subreddits):
+        self.path = path
+        self.ttl = ttl
+        self.max_subreddits = max_subreddits
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS subreddits (
+                name TEXT PRIMARY KEY,
+                subscribers INTEGER,
+                fetched_at REAL,
+                last_access REAL,
+                since REAL
+            );
+            CREATE TABLE IF NOT EXISTS posts (
+                subreddit TEXT,
+                id TEXT,
+                created_utc REAL,
+                num_comments INTEGER,
+                data TEXT,
+                PRIMARY KEY (subreddit, id)
+            );
+            CREATE TABLE IF NOT EXISTS comments (
+                subreddit TEXT,
+                post_id TEXT,
+                num_comments INTEGER,
+                data TEXT,
+                PRIMARY KEY (subreddit, post_id)
+            );
+        """)
+        try:
+            self._conn.execute("ALTER TABLE subreddits ADD COLUMN since REAL")
+        except sqlite3.OperationalError:
+            pass
+        self.evict()
+
+    def _key(self, subreddit_name):
+        return subreddit_name.lower()
+
+    def subreddit(self, subreddit_name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT subscribers, fetched_at, since FROM subreddits WHERE name = ?", (self._key(subreddit_name),)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return {"subscribers": row[0], "fetched_at": row[1], "since": row[2] or 0}
+
+    def get_posts(self, subreddit_name, since=0):
+        key = self._key(subreddit_name)
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE subreddits SET last_access = ? WHERE name = ?", (time.time(), key))
+            rows = self._conn.execute(
+                "SELECT data FROM posts WHERE subreddit = ? AND created_utc >= ? ORDER BY created_utc DESC",
+                (key, since)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def put_posts(self, subreddit_name, posts, subscribers, since=0, fetched=True):
+        # fetched_at moves only when the subreddit was actually fetched, not when a run was served from here.
+        key = self._key(subreddit_name)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO subreddits (name, subscribers, fetched_at, last_access, since) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET subscribers = excluded.subscribers, "
+                "last_access = excluded.last_access, since = excluded.since, "
+                "fetched_at = CASE WHEN ? THEN excluded.fetched_at ELSE fetched_at END",
+                (key, subscribers, now, now, since, fetched)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO posts (subreddit, id, created_utc, num_comments, data) VALUES (?, ?, ?, ?, ?)",
+                [(key, post["id"], post["created_utc"], post["num_comments"], json.dumps(post)) for post in posts]
+            )
+            self._conn.execute(
+                "DELETE FROM comments WHERE subreddit = ? AND post_id IN "
+                "(SELECT id FROM posts WHERE subreddit = ? AND created_utc < ?)",
+                (key, key, since)
+            )
+            self._conn.execute("DELETE FROM posts WHERE subreddit = ? AND created_utc < ?", (key, since))
+        self.evict()
+
+    def get_comments(self, post_ids):
+        post_ids = list(post_ids)
+        cached = {}
+        with self._lock:
+            for start in range(0, len(post_ids), 500):
+                id_chunk = post_ids[start:start + 500]
+                placeholders = ",".join("?" * len(id_chunk))
+                rows = self._conn.execute(
+                    f"SELECT post_id, num_comments, data FROM comments WHERE post_id IN ({placeholders})", id_chunk
+                ).fetchall()
+                for post_id, num_comments, data in rows:
+                    # Threads are stored as Arrow IPC; rows written before that hold JSON records.
+                    batch = comments_to_batch(json.loads(data)) if isinstance(data, str) else batch_from_bytes(data)
+                    cached[post_id] = (num_comments, batch)
+        return cached
+
+    def put_comments(self, post_id, num_comments, comments):
+        # comments is the thread's Arrow record batch.
+        data = batch_to_bytes(comments)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO comments (subreddit, post_id, num_comments, data) "
+                "SELECT subreddit, ?, ?, ? FROM posts WHERE id = ?",
+                (post_id, num_comments, data, post_id)
+            )
+
+    def evict(self):
+        expired_before = time.time() - self.ttl
+        with self._lock, self._conn:
+            stale = [row[0] for row in self._conn.execute(
+                "SELECT name FROM subreddits WHERE fetched_at < ? "
+                "UNION SELECT name FROM subreddits WHERE name NOT IN "
+                "(SELECT name FROM subreddits ORDER BY last_access DESC LIMIT ?)",
+                (expired_before, self.max_subreddits)
+            )]
+            for name in stale:
+                self._conn.execute("DELETE FROM comments WHERE subreddit = ?", (name,))
+                self._conn.execute("DELETE FROM posts WHERE subreddit = ?", (name,))
+                self._conn.execute("DELETE FROM subreddits WHERE name = ?", (name,))
+        return stale
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,69 @@
+import re
+from collections import Counter
+import pandas as pd
+from src.stopwords import ENGLISH_STOP_WORDS
+from src.sketches import SpaceSaving
+
+token_pattern = re.compile(r'\b\w+\b')
+min_word_length = 3
+
+
+class TermIndex:
+    # Per-post term counts plus their running total. Posts are tokenized once and every keyword
+    # feature (top-N table, word cloud) reads from here; re-adding a post replaces its old counts.
+    # With approximate=True the totals are a Space-Saving sketch of the most frequent words and per-post
+    # counts aren't kept; a post that is added again is skipped instead of replaced.
+    def __init__(self, stop_words=ENGLISH_STOP_WORDS, min_length=min_word_length, approximate=False):
+        self.stop_words = frozenset(stop_words)
+        self.min_length = min_length
+        self.approximate = approximate
+        self.documents = {}
+        self.frequencies = SpaceSaving() if approximate else Counter()
+
+    def tokenize(self, text):
+        # Count first and filter the distinct words afterwards: far fewer membership checks than
+        # filtering every token, and Counter keeps first-seen order for ties.
+        counts = Counter(token_pattern.findall(text.lower()))
+        return Counter({
+            word: count for word, count in counts.items()
+            if len(word) >= self.min_length and word not in self.stop_words
+        })
+
+    def add(self, doc_id, text):
+        if doc_id in self.documents:
+            if self.approximate:
+                return None
+            self.remove(doc_id)
+        counts = self.tokenize(text)
+        self.documents[doc_id] = None if self.approximate else counts
+        self.frequencies.update(counts)
+        return counts
+
+    def remove(self, doc_id):
+        counts = self.documents.pop(doc_id, None)
+        if counts:
+            self.frequencies.subtract(counts)
+            for word in counts:
+                if self.frequencies[word] <= 0:
+                    del self.frequencies[word]
+
+    def add_posts(self, df_posts):
+        texts = df_posts['title'].fillna('') + ' ' + df_posts['selftext'].fillna('')
+        if self.approximate:
+            # One sketch update for the whole batch rather than one per post.
+            batch = Counter()
+            for doc_id, text in zip(df_posts['id'], texts):
+                if doc_id not in self.documents:
+                    self.documents[doc_id] = None
+                    batch.update(self.tokenize(text))
+            self.frequencies.update(batch)
+            return self
+        for doc_id, text in zip(df_posts['id'], texts):
+            self.add(doc_id, text)
+        return self
+
+    def most_common(self, top_n=20):
+        return pd.DataFrame(self.frequencies.most_common(top_n), columns=['Word', 'Frequency'])
+
+    def __len__(self):
+        return len(self.documents)
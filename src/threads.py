@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from src.preprocess import seconds
+from src.topk import author_codes, excluded_mask, top_k, top_k_indices
+
+latency_percentiles = (50, 90, 99)
+# Replies to or from deleted accounts say nothing about who talks to whom.
+excluded_repliers = ("[deleted]",)
+
+
+def parent_rows(comment_ids, parent_ids):
+    # Row of each comment's parent comment; -1 for top-level comments and for parents that weren't
+    # fetched (collapsed behind a "more" stub). Each distinct parent id is looked up once, with Arrow's
+    # hash lookup over the comment ids, and spread to the rows by its code.
+    codes, parents = author_codes(parent_ids)
+    parents = pa.array(np.asarray(parents, dtype=object), pa.string())
+    is_comment = pc.starts_with(parents, "t1_").to_numpy(zero_copy_only=False)
+    found = pc.index_in(pc.utf8_slice_codeunits(parents, 3), value_set=pa.array(comment_ids, pa.string()))
+    parent_of = np.where(is_comment, found.fill_null(-1).to_numpy(), -1)
+    # Missing parent ids (code -1) pick up the trailing -1.
+    return np.append(parent_of, -1)[codes], np.append(~is_comment, False)[codes]
+
+
+def percentiles(values, points=latency_percentiles):
+    if not len(values):
+        return {f"p{point}": None for point in points}
+    return {f"p{point}": float(value) for point, value in zip(points, np.percentile(values, points))}
+
+
+def first_reply(groups, latency, size):
+    # Earliest latency per group (post or parent comment); groups nobody replied to stay inf.
+    first = np.full(size, np.inf)
+    np.minimum.at(first, groups, latency)
+    return first
+
+
+def reply_edges(authors, parents, excluded=excluded_repliers):
+    # author -> replied_to -> replies, one row per pair that exchanged at least one reply.
+    codes, index = author_codes(authors)
+    replies = np.flatnonzero(parents >= 0)
+    source, target = codes[replies], codes[parents[replies]]
+    keep = (source >= 0) & (target >= 0)
+    if len(excluded):
+        skip = np.append(excluded_mask(index, excluded), True)
+        keep &= ~skip[source] & ~skip[target]
+    # Pairs counted in one hashed pass over a single int64 key rather than a tuple per reply.
+    pairs = pd.Series(source[keep].astype(np.int64) * len(index) + target[keep]).value_counts(sort=False)
+    pair_keys = pairs.index.to_numpy()
+    return pd.DataFrame({
+        "author": np.asarray(index, dtype=object)[pair_keys // max(len(index), 1)],
+        "replied_to": np.asarray(index, dtype=object)[pair_keys % max(len(index), 1)],
+        "replies": pairs.to_numpy()
+    })
+
+
+def thread_structure(df_comments, df_posts=None, k=top_k, excluded=excluded_repliers):
+    # Reply structure of every thread from one vectorized pass over the comment columns: parent links
+    # resolve to row numbers once, and depth, latencies, fan-out and reply edges are all array operations
+    # on them, so a 100k-comment megathread costs the same per comment as a small one.
+    parents, top_level = parent_rows(df_comments["comment_id"], df_comments["parent_id"])
+    linked = np.asarray(df_comments["parent_id"].notna())
+    created = seconds(df_comments["comment_created_at"])
+    is_reply = parents >= 0
+    reply_rows = np.flatnonzero(is_reply)
+    # Clock skew can put a reply a moment before its parent.
+    latency = np.maximum(created[reply_rows] - created[parents[reply_rows]], 0)
+
+    depth = df_comments["depth"].to_numpy(dtype=float, na_value=np.nan)
+    depth = depth[~np.isnan(depth)].astype(np.int64)
+    depth_counts = np.bincount(depth) if len(depth) else np.zeros(0, dtype=np.int64)
+
+    reply_counts = np.bincount(parents[reply_rows], minlength=len(df_comments))
+    comment_first = first_reply(parents[reply_rows], latency, len(df_comments))
+
+    post_first = np.zeros(0)
+    if df_posts is not None and len(df_posts):
+        post_codes = pd.Index(np.asarray(df_posts["id"], dtype=object)).get_indexer(
+            np.asarray(df_comments["post_id"], dtype=object)
+        )
+        in_window = post_codes >= 0
+        post_created = seconds(df_posts["created_at"])
+        post_first = first_reply(
+            post_codes[in_window],
+            np.maximum(created[in_window] - post_created[post_codes[in_window]], 0),
+            len(df_posts)
+        )
+        post_first = post_first[np.isfinite(post_first)]
+
+    edges = reply_edges(df_comments["comment_author"], parents, excluded)
+    top = edges.iloc[top_k_indices(edges["replies"].to_numpy(), k)].reset_index(drop=True)
+    return {
+        "comments": len(df_comments),
+        "top_level": int(top_level.sum()),
+        "replies": len(reply_rows),
+        # Replies whose parent comment wasn't fetched.
+        "orphans": int((linked & ~top_level & ~is_reply).sum()),
+        "max_depth": len(depth_counts) - 1 if len(depth_counts) else None,
+        "depth_distribution": {depth: int(count) for depth, count in enumerate(depth_counts) if count},
+        "replied_share": round(float((reply_counts > 0).mean()), 4) if len(df_comments) else 0.0,
+        "max_replies": int(reply_counts.max()) if len(df_comments) else 0,
+        "reply_latency": percentiles(latency),
+        "comment_first_reply": percentiles(comment_first[np.isfinite(comment_first)]),
+        "post_first_reply": percentiles(post_first),
+        "reply_edges": len(edges),
+        "top_reply_edges": top
+    }
@@ -0,0 +1,98 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+top_k = 5
+# Matched case-insensitively. Bots and deleted accounts are kept out of the top commenters, and
+# AutoModerator's pinned comments out of the top comments by upvotes.
+excluded_commenters = ("[deleted]", "AutoModerator")
+excluded_comment_authors = ("AutoModerator",)
+
+
+def excluded_mask(authors, excluded):
+    if not len(excluded):
+        return np.zeros(len(authors), dtype=bool)
+    excluded = [author.lower() for author in excluded]
+    codes, index = author_codes(authors)
+    # Checked once per distinct author, then spread to the rows by code; missing authors (code -1)
+    # pick up the trailing False.
+    excluded_codes = np.append(index.str.lower().isin(excluded), False)
+    return excluded_codes[codes]
+
+
+def top_k_indices(values, k=top_k):
+    # Positions of the k largest values, largest first; ties go to the earlier row, like nlargest(keep="first").
+    # argpartition finds the k-th largest in O(n), and only the k survivors are sorted.
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        # NaN ranks below everything, as in nlargest.
+        values = np.where(np.isnan(values), -np.inf, values)
+    if k <= 0 or not len(values):
+        return np.arange(0)
+    if k < len(values):
+        kth = values[np.argpartition(values, len(values) - k)[len(values) - k]]
+        above = np.flatnonzero(values > kth)
+        ties = np.flatnonzero(values == kth)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+def top_rows(df, column, columns, k=top_k, excluded=(), author_column=None):
+    # Only the k winning rows are ever copied out of df.
+    values = df[column].to_numpy()
+    if author_column is not None and len(excluded):
+        positions = np.flatnonzero(~excluded_mask(df[author_column], excluded))
+        rows = positions[top_k_indices(values[positions], k)]
+    else:
+        rows = top_k_indices(values, k)
+    return df.iloc[rows][columns].reset_index(drop=True)
+
+
+def author_codes(authors):
+    # Integer codes plus the authors they stand for. Frames from preprocess already carry dictionary
+    # codes in their categorical author columns; anything else is factorized once here.
+    if isinstance(getattr(authors, "dtype", None), pd.CategoricalDtype):
+        return np.asarray(authors.cat.codes), pd.Index(authors.cat.categories)
+    codes, uniques = pd.factorize(np.asarray(authors, dtype=object))
+    return codes, pd.Index(uniques)
+
+
+def author_activity(post_authors, comment_authors):
+    # One row per author with post, comment and total counts, from np.bincount over the author codes
+    # mapped into one shared author index.
+    post_codes, post_index = author_codes(post_authors)
+    comment_codes, comment_index = author_codes(comment_authors)
+    authors = post_index.union(comment_index, sort=False)
+
+    def count(codes, index):
+        codes = codes[codes >= 0]
+        return np.bincount(authors.get_indexer(index)[codes], minlength=len(authors))
+
+    posts = count(post_codes, post_index)
+    comments = count(comment_codes, comment_index)
+    return pd.DataFrame(
+        {"posts": posts, "comments": comments, "total": posts + comments},
+        index=authors.rename("author")
+    )
+
+
+def top_authors(activity, column="total", k=top_k, excluded=()):
+    activity = activity[activity[column] > 0]
+    if len(excluded):
+        activity = activity[~excluded_mask(activity.index, excluded)]
+    # Everything tied with the k-th count is a candidate; only those are sorted, by count then name.
+    values = activity[column].to_numpy()
+    if 0 < k < len(values):
+        kth = values[np.argpartition(values, len(values) - k)[len(values) - k]]
+        activity = activity[values >= kth]
+    top = activity.sort_values([column, "author"], ascending=[False, True])[column].head(k)
+    return top.rename("count")
+
+
+def top_counts(counts, k=top_k, excluded=()):
+    # Same ranking over an author -> count mapping (AggregateState's counters): highest count, then name.
+    excluded = {author.lower() for author in excluded}
+    items = ((author, count) for author, count in counts.items() if count and author.lower() not in excluded)
+    return heapq.nsmallest(k, items, key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+from src.topk import top_k, top_k_indices
+
+# name: (bucket width, how long after posting the rollup follows a post), both in seconds. Comments
+# arriving later land in one overflow bucket per post.
+bucket_sizes = {
+    "5min": (5 * 60, 24 * 60 * 60),
+    "1h": (60 * 60, 7 * 24 * 60 * 60),
+    "1d": (24 * 60 * 60, 30 * 24 * 60 * 60)
+}
+default_bucket = "1h"
+
+
+class VelocityRollup:
+    # Comment counts per post and per time-since-posting bucket, for every bucket size. Only the
+    # (post, bucket) pairs that received comments are stored, as counts keyed by row * columns + bucket,
+    # so a 50k-post rollup holds what the comments fill rather than a dense posts x buckets matrix. Each
+    # comment batch is binned into all sizes at once and its pair counts queued; queued counts are summed
+    # into the stored ones once they outgrow them, or when a curve is read.
+    def __init__(self, sizes=bucket_sizes):
+        self.sizes = sizes
+        self.columns = {name: horizon // width + 1 for name, (width, horizon) in sizes.items()}
+        self.post_ids = pd.Index([], dtype=object)
+        self.post_created = np.zeros(0)
+        self._counts = {name: pd.Series([], dtype=np.int64) for name in sizes}
+        self._pending = {name: [] for name in sizes}
+        # Latest post or comment time seen; how long each post has been up, for the exposure of each bucket.
+        self.as_of = 0.0
+        self.unmatched = 0
+
+    def add_posts(self, post_ids, created):
+        post_ids = pd.Index(np.asarray(post_ids, dtype=object))
+        created = np.asarray(created, dtype=float)
+        new = self.post_ids.get_indexer(post_ids) < 0
+        if new.any():
+            post_ids, created = post_ids[new], created[new]
+            first = ~post_ids.duplicated()
+            self.post_ids = self.post_ids.append(post_ids[first])
+            self.post_created = np.concatenate([self.post_created, created[first]])
+        if len(created):
+            self.as_of = max(self.as_of, float(created.max()))
+        return self
+
+    def _add_pairs(self, name, keys):
+        pending = self._pending[name]
+        pending.append(pd.Series(keys).value_counts(sort=False))
+        if sum(len(counts) for counts in pending) > len(self._counts[name]):
+            self.counts(name)
+
+    def add_comments(self, post_ids, created):
+        rows = self.post_ids.get_indexer(np.asarray(post_ids, dtype=object))
+        created = np.asarray(created, dtype=float)
+        matched = rows >= 0
+        self.unmatched += int((~matched).sum())
+        rows, created = rows[matched], created[matched]
+        if not len(rows):
+            return self
+        self.as_of = max(self.as_of, float(created.max()))
+        # Clock skew can date a comment a moment before its post.
+        age = np.maximum(created - self.post_created[rows], 0)
+        for name, (width, horizon) in self.sizes.items():
+            columns = self.columns[name]
+            buckets = np.minimum(age // width, columns - 1).astype(np.int64)
+            self._add_pairs(name, rows.astype(np.int64) * columns + buckets)
+        return self
+
+    def merge(self, other):
+        self.add_posts(other.post_ids, other.post_created)
+        rows = self.post_ids.get_indexer(other.post_ids).astype(np.int64)
+        for name, columns in self.columns.items():
+            keys = other.counts(name)
+            if len(keys):
+                own = rows[keys.index.to_numpy() // columns] * columns + keys.index.to_numpy() % columns
+                self._pending[name].append(pd.Series(keys.to_numpy(), index=own))
+        self.as_of = max(self.as_of, other.as_of)
+        self.unmatched += other.unmatched
+        return self
+
+    def counts(self, name):
+        # Comments per (post, bucket) pair, keyed by row * columns + bucket; the last column is the overflow.
+        if self._pending[name]:
+            combined = pd.concat([self._counts[name], *self._pending[name]])
+            self._counts[name] = combined.groupby(level=0, sort=False).sum().astype(np.int64)
+            self._pending[name] = []
+        return self._counts[name]
+
+    def _pairs(self, name):
+        # Rows, buckets and counts of the pairs within the horizon.
+        counts = self.counts(name)
+        keys = counts.index.to_numpy()
+        rows, buckets = keys // self.columns[name], keys % self.columns[name]
+        inside = buckets < self.columns[name] - 1
+        return rows[inside], buckets[inside], counts.to_numpy()[inside]
+
+    def curve(self, name=default_bucket):
+        # Comments per post per hour in each bucket since posting. A post only counts towards the
+        # buckets it has been up for, so recent posts don't drag the later buckets down.
+        width, horizon = self.sizes[name]
+        starts = np.arange(horizon // width) * width
+        _, buckets, counts = self._pairs(name)
+        comments = np.bincount(buckets, weights=counts, minlength=len(starts)).astype(np.int64)
+        exposed = np.searchsorted(np.sort(self.as_of - self.post_created), starts, side="right")
+        exposed = len(self.post_created) - exposed
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(exposed > 0, comments / exposed / (width / 3600), np.nan)
+        curve = pd.DataFrame({
+            "hours_since_post": starts / 3600, "comments": comments, "posts": exposed,
+            "comments_per_post_hour": rate
+        })
+        # Trailing buckets no post has reached yet carry no information.
+        return curve[curve["posts"] > 0].reset_index(drop=True)
+
+    def post_velocity(self, name=default_bucket):
+        # Per post: comments within the horizon, the first bucket's rate and the peak bucket's rate
+        # (both in comments per hour) and when the peak came; the earliest bucket wins a tie.
+        width, _ = self.sizes[name]
+        n_posts = len(self.post_ids)
+        rows, buckets, counts = self._pairs(name)
+        order = np.lexsort((buckets, -counts, rows))
+        rows, buckets, counts = rows[order], buckets[order], counts[order]
+        first = np.ones(len(rows), bool)
+        first[1:] = rows[1:] != rows[:-1]
+        peak_count = np.zeros(n_posts, np.int64)
+        peak = np.zeros(n_posts, np.int64)
+        peak_count[rows[first]] = counts[first]
+        peak[rows[first]] = buckets[first]
+        opening = buckets == 0
+        first_bucket = np.bincount(rows[opening], weights=counts[opening], minlength=n_posts)
+        return pd.DataFrame({
+            "post_id": np.asarray(self.post_ids, dtype=object),
+            "comments": np.bincount(rows, weights=counts, minlength=n_posts).astype(np.int64),
+            "first_bucket_rate": first_bucket / (width / 3600),
+            "peak_rate": peak_count / (width / 3600),
+            "peak_hours_since_post": peak * width / 3600
+        })
+
+    def fastest_posts(self, name=default_bucket, k=top_k):
+        velocity = self.post_velocity(name)
+        return velocity.iloc[top_k_indices(velocity["peak_rate"].to_numpy(), k)].reset_index(drop=True)
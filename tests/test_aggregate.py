@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+import helper
+from src.aggregate import AggregateState
+from src.fetch import fetch_comments_parallel, fetch_recent_posts
+from src.preprocess import preprocesscomments, preprocessposts
+from src.source import ReplaySource, synthetic_fixture
+
+
+@pytest.fixture(scope="module")
+def frames():
+    reddit = ReplaySource({"alpha": synthetic_fixture("alpha", 300, 6000, seed=7)})
+    posts, _ = fetch_recent_posts("alpha", reddit)
+    return preprocessposts(posts), preprocesscomments(fetch_comments_parallel(posts, reddit))
+
+
+def state_results(state):
+    return (state.stats(), state.post_summary(), state.comment_summary(), state.activity(), state.user_insights(),
+            state.top_performers())
+
+
+def helper_results(df_posts, df_comments):
+    return (helper.fetch_stats(df_posts, df_comments), helper.fetch_post_summary(df_posts),
+            helper.fetch_comment_summary(df_comments), helper.activity_analysis(df_posts, df_comments),
+            helper.user_insights(df_posts, df_comments), helper.top_performers(df_posts, df_comments))
+
+
+def assert_same_results(results, expected):
+    stats, post_summary, comment_summary, activity, user_insights, top_performers = results
+    assert stats == expected[0]
+    assert post_summary == expected[1]
+
+    for key in ["total_comments", "avg_upvotes", "top_authors"]:
+        assert comment_summary[key] == expected[2][key]
+    for key in ["comments_per_date", "comments_per_hour"]:
+        assert list(comment_summary[key].items()) == list(expected[2][key].items())
+
+    for frame, expected_frame in zip(activity, expected[3]):
+        pd.testing.assert_frame_equal(frame, expected_frame, check_dtype=False, check_categorical=False)
+
+    pd.testing.assert_series_equal(user_insights[0], expected[4][0], check_names=False)
+    assert tuple(user_insights[1:]) == tuple(expected[4][1:])
+
+    for frame, expected_frame in zip(top_performers, expected[5]):
+        pd.testing.assert_frame_equal(frame.astype(object), expected_frame.astype(object), check_dtype=False)
+
+
+def test_state_matches_the_helper_functions(frames):
+    df_posts, df_comments = frames
+    state = AggregateState().add_posts(df_posts).add_comments(df_comments)
+    assert_same_results(state_results(state), helper_results(df_posts, df_comments))
+
+
+def test_merged_shards_match_one_state_over_all_rows(frames):
+    df_posts, df_comments = frames
+    whole = AggregateState().add_posts(df_posts).add_comments(df_comments)
+    first = AggregateState().add_posts(df_posts.iloc[:100]).add_comments(df_comments.iloc[:2500])
+    second = AggregateState().add_posts(df_posts.iloc[100:]).add_comments(df_comments.iloc[2500:4000])
+    second.add_comments(df_comments.iloc[4000:])
+    assert_same_results(state_results(first.merge(second)), state_results(whole))
@@ -0,0 +1,9 @@
+import pytest
+from src.analysis import ThreadInsight
+from src.source import ReplaySource, synthetic_fixture
+
+
+def test_activity_needs_a_partition_store():
+    insight = ThreadInsight(ReplaySource({"alpha": synthetic_fixture("alpha", 5, 20)}))
+    with pytest.raises(ValueError, match="partitions"):
+        insight.activity("alpha")
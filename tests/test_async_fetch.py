@@ -0,0 +1,68 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+import pytest
+from src.async_fetch import fetch_comments_async, fetch_subreddit_async
+from src.metrics import metrics
+from src.ratelimit import TokenBucket
+
+
+class FakeComments:
+    def __init__(self, comments):
+        self.comments = comments
+
+    async def replace_more(self, limit=0):
+        pass
+
+    def list(self):
+        return self.comments
+
+
+class FakeReddit:
+    # Serves threads of plain comment objects; a post fails the given number of times before it loads.
+    def __init__(self, threads, failures):
+        self.threads = threads
+        self.failures = dict(failures)
+
+    async def submission(self, post_id):
+        if self.failures.get(post_id, 0):
+            self.failures[post_id] -= 1
+            raise RuntimeError(f"thread {post_id} unavailable")
+        return SimpleNamespace(comments=FakeComments(self.threads[post_id]))
+
+
+def comment(comment_id, post_id):
+    return SimpleNamespace(id=comment_id, author=SimpleNamespace(name="user"), score=1, created_utc=1_700_000_000.0,
+                           parent_id=f"t3_{post_id}", depth=0)
+
+
+def fetch(failures):
+    threads = {post_id: [comment(f"{post_id}_c{i}", post_id) for i in range(3)] for post_id in ["a", "b", "c"]}
+    posts = [{"id": post_id, "num_comments": len(thread)} for post_id, thread in threads.items()]
+    reddit = FakeReddit(threads, failures)
+    return asyncio.run(fetch_comments_async(posts, reddit, TokenBucket(10000, 10000)))
+
+
+def test_failed_threads_are_retried():
+    snapshot = metrics.snapshot()
+    comments, coverage = fetch({"b": 2})
+    report = metrics.report(since=snapshot)
+    assert report["counters"]["retries{stage=comments}"] == 2
+    assert report["spans"]["fetch.comments"]["rows"] == 9
+    assert len(comments) == 9
+    assert coverage["coverage"] == 1.0
+    assert coverage["failed_posts"] == []
+    assert coverage["requests"] == 5
+
+
+def test_threads_that_keep_failing_are_reported():
+    comments, coverage = fetch({"b": 5})
+    assert {record["post_id"] for record in comments} == {"a", "c"}
+    assert coverage["posts_fetched"] == 2
+    assert coverage["failed_posts"] == ["b"]
+
+
+def test_missing_asyncpraw_is_reported(monkeypatch):
+    monkeypatch.setitem(sys.modules, "asyncpraw", None)
+    with pytest.raises(ImportError, match="pip install"):
+        fetch_subreddit_async("alpha", "id", "secret", "agent")
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+import pandas as pd
+import prawcore
+from src.batch import run_batch
+from src.ratelimit import TokenBucket
+from src.source import ReplaySource, synthetic_fixture
+
+
+class PartlyPrivateSource(ReplaySource):
+    def subreddit(self, name):
+        if name == "private":
+            raise prawcore.exceptions.Forbidden(SimpleNamespace(status_code=403, headers={}))
+        if name == "offline":
+            raise prawcore.exceptions.RequestException(ConnectionError("connection reset"), (), {})
+        return super().subreddit(name)
+
+
+def test_failing_subreddits_dont_stop_the_batch(tmp_path):
+    source = PartlyPrivateSource({name: synthetic_fixture(name, 20, 100) for name in ["a", "b"]})
+    comparison, failures = run_batch(
+        ["a", "private", "offline", "b", "missing"], source, limiter=TokenBucket(10000, 10000), out_dir=tmp_path,
+        workers=1
+    )
+    assert list(comparison["subreddit"]) == ["a", "b"]
+    assert set(failures) == {"private", "offline", "missing"}
+    assert "Forbidden" in failures["private"]
+    assert "does not exist" in failures["missing"]
+    assert list(pd.read_csv(tmp_path / "comparison.csv")["subreddit"]) == ["a", "b"]
@@ -0,0 +1,37 @@
+from src.analysis import ThreadInsight
+from src.checkpoint import CheckpointStore
+from src.ratelimit import TokenBucket
+from src.source import ReplaySource, synthetic_fixture
+
+
+class FlakySource(ReplaySource):
+    # Threads in broken raise; every thread asked for is recorded in requested.
+    def __init__(self, fixtures):
+        super().__init__(fixtures)
+        self.broken = set()
+        self.requested = []
+
+    def comment_rows(self, post_id, more_limit=0, max_depth=None):
+        self.requested.append(post_id)
+        if post_id in self.broken:
+            raise ConnectionError(f"connection reset on {post_id}")
+        return super().comment_rows(post_id, more_limit, max_depth)
+
+
+def test_resumed_job_fetches_only_the_failed_threads(tmp_path):
+    fixture = synthetic_fixture("alpha", 30, 600)
+    source = FlakySource({"alpha": fixture})
+    insight = ThreadInsight(source, limiter=TokenBucket(10000, 10000), checkpoints=CheckpointStore(tmp_path, every=5))
+    source.broken = {post["id"] for post in sorted(fixture["posts"], key=lambda post: -post["num_comments"])[:2]}
+
+    first = insight.analyze("alpha")
+    assert first.coverage["failed_posts"] == sorted(source.broken)
+    assert list(tmp_path.iterdir())
+
+    failed, source.broken, source.requested = set(source.broken), set(), []
+    second = insight.analyze("alpha")
+    assert sorted(source.requested) == sorted(failed)
+    assert second.coverage["failed_posts"] == []
+    assert second.comments_count == ThreadInsight(ReplaySource({"alpha": fixture})).analyze("alpha").comments_count
+    # A job that completes is deleted.
+    assert not list(tmp_path.iterdir())
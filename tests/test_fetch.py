@@ -0,0 +1,39 @@
+import time
+from src.fetch import fetch_recent_posts, iter_comment_batches
+from src.ratelimit import TokenBucket
+from src.source import ReplaySource, synthetic_fixture
+from src.store import PostStore
+
+limiter = TokenBucket(10000, 10000)
+
+
+def test_warm_cache_still_lists_new_posts(tmp_path):
+    fixture = synthetic_fixture("alpha", 40, 200)
+    store = PostStore(tmp_path / "cache.sqlite")
+    fetch_recent_posts("alpha", ReplaySource({"alpha": fixture}), store, limiter=limiter, max_posts=10)
+    fetched_at = store.subreddit("alpha")["fetched_at"]
+
+    fixture["posts"].append({**fixture["posts"][0], "id": "alpha_new", "created_utc": float(int(time.time()))})
+    cached, _ = fetch_recent_posts("alpha", ReplaySource({"alpha": fixture}), store, limiter=limiter, max_posts=10)
+    uncached, _ = fetch_recent_posts("alpha", ReplaySource({"alpha": fixture}), limiter=limiter, max_posts=10)
+    assert cached[0]["id"] == "alpha_new"
+    assert [post["id"] for post in cached] == [post["id"] for post in uncached]
+    # Serving a run from the cache doesn't extend its TTL.
+    assert store.subreddit("alpha")["fetched_at"] == fetched_at
+
+
+def test_posts_before_the_window_wait_for_the_window_posts():
+    reddit = ReplaySource({"alpha": synthetic_fixture("alpha", 40, 800, days=2)})
+    posts, _ = fetch_recent_posts("alpha", reddit, limiter=limiter, since=time.time() - 2 * 86400)
+    start = time.time() - 86400
+    window_ids = {post["id"] for post in posts if post["created_utc"] >= start}
+    assert 0 < len(window_ids) < len(posts)
+
+    # Only enough requests for the window's threads: the earlier ones are cut, but the report isn't.
+    batches = list(iter_comment_batches(posts, reddit, limiter=limiter, request_budget=len(window_ids),
+                                        window_start=start))
+    coverage = batches[-1][1]
+    assert {comment["post_id"] for batch, _ in batches for comment in batch} <= window_ids
+    assert coverage["posts_total"] == coverage["posts_fetched"] == len(window_ids)
+    assert coverage["coverage"] == 1.0
+    assert not coverage["truncated"] and not coverage["complete"]
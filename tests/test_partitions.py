@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+import pyarrow.parquet as pq
+from src import partitions as partitions_module
+from src.columnar import comments_to_batch
+from src.partitions import PartitionStore
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def post(post_id, created):
+    return {"id": post_id, "author": "op", "title": "", "selftext": "", "is_self": True, "num_comments": 1,
+            "over_18": False, "spoiler": False, "locked": False, "gilded": 0, "upvotes": 1, "created_utc": created,
+            "post_type": "text", "account_age_days": 100.0}
+
+
+def comment(post_id, created):
+    return {"comment_id": f"{post_id}_c", "comment_author": "alice", "comment_upvotes": 1,
+            "comment_created_utc": created + 60, "post_id": post_id, "parent_id": f"t3_{post_id}", "depth": 0}
+
+
+posts = [post("a", utc(2024, 5, 1, 3)), post("b", utc(2024, 5, 1, 20)), post("c", utc(2024, 5, 2, 12)),
+         post("d", utc(2024, 5, 3, 9))]
+comments = comments_to_batch([comment(p["id"], p["created_utc"]) for p in posts])
+
+
+def sealed_days(partitions):
+    return {day: entry["sealed"] for day, entry in partitions.manifest("alpha").items()}
+
+
+def test_finished_days_seal_and_read_back(tmp_path):
+    partitions = PartitionStore(tmp_path)
+    partitions.write("Alpha", posts, comments, utc(2024, 5, 1), utc(2024, 5, 3, 12))
+    assert sealed_days(partitions) == {"2024-05-01": True, "2024-05-02": True, "2024-05-03": False}
+    assert partitions.resume_from("alpha", utc(2024, 5, 1, 6), utc(2024, 5, 3, 13)) == utc(2024, 5, 3)
+
+    read_posts, read_comments = partitions.read_posts("alpha", utc(2024, 5, 1, 6), utc(2024, 5, 3))
+    assert [p["id"] for p in read_posts] == ["b", "c"]
+    assert sorted(read_comments.column("post_id").to_pylist()) == ["b", "c"]
+
+
+def test_read_opens_only_the_days_in_range(tmp_path, monkeypatch):
+    partitions = PartitionStore(tmp_path)
+    partitions.write("alpha", posts, comments, utc(2024, 5, 1), utc(2024, 5, 3, 12))
+    opened = []
+    read_table = pq.read_table
+
+    def counting_read_table(path, **kwargs):
+        opened.append(path.name)
+        return read_table(path, **kwargs)
+
+    monkeypatch.setattr(partitions_module.pq, "read_table", counting_read_table)
+    read_posts, read_comments = partitions.read("alpha", utc(2024, 5, 2), utc(2024, 5, 2, 23),
+                                                post_columns=["id"], comment_columns=["comment_id"])
+    assert opened == ["2024-05-02.parquet", "2024-05-02.parquet"]
+    assert read_posts.column_names == ["id"] and read_posts.column("id").to_pylist() == ["c"]
+    assert read_comments.column_names == ["comment_id"] and read_comments.num_rows == 1
+
+
+def test_partial_truncated_and_capped_days_stay_unsealed(tmp_path):
+    partitions = PartitionStore(tmp_path / "partial")
+    partitions.write("alpha", posts, comments, utc(2024, 5, 1, 6), utc(2024, 5, 4, 1))
+    assert sealed_days(partitions) == {"2024-05-01": False, "2024-05-02": True, "2024-05-03": True,
+                                       "2024-05-04": False}
+
+    partitions = PartitionStore(tmp_path / "truncated")
+    partitions.write("alpha", posts, comments, utc(2024, 5, 1), utc(2024, 5, 4, 1), truncated=True)
+    assert not any(sealed_days(partitions).values())
+    assert partitions.resume_from("alpha", utc(2024, 5, 1, 6), utc(2024, 5, 4, 1)) == utc(2024, 5, 1)
+
+    # The listing hit max_posts at c: nothing before its day was seen and its day is only partly there.
+    partitions = PartitionStore(tmp_path / "capped")
+    partitions.write("alpha", posts[2:], comments, utc(2024, 5, 1), utc(2024, 5, 4, 1), capped=True)
+    assert sealed_days(partitions) == {"2024-05-02": False, "2024-05-03": True, "2024-05-04": False}
+    assert partitions.resume_from("alpha", utc(2024, 5, 1), utc(2024, 5, 4, 1)) == utc(2024, 5, 1)
+
+
+def test_resume_from_only_rounds_back_for_days_that_can_seal(tmp_path):
+    partitions = PartitionStore(tmp_path)
+    # A 6-hour window at 23:00 lies inside a day that hasn't ended, so it is fetched from its start.
+    assert partitions.resume_from("alpha", utc(2024, 5, 1, 17), utc(2024, 5, 1, 23)) == utc(2024, 5, 1, 17)
+    # At 02:00 the window's first day is over and fetching from its midnight lets it seal.
+    assert partitions.resume_from("alpha", utc(2024, 5, 1, 20), utc(2024, 5, 2, 2)) == utc(2024, 5, 1)
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+import prawcore
+import pytest
+from src.source import PrawSource
+
+
+def response(status_code, location=None):
+    return SimpleNamespace(status_code=status_code, headers={"location": location} if location else {})
+
+
+class FailingSubreddit:
+    def __init__(self, error):
+        self.error = error
+
+    @property
+    def id(self):
+        raise self.error
+
+
+def source(error):
+    return PrawSource(SimpleNamespace(subreddit=lambda name: FailingSubreddit(error)))
+
+
+@pytest.mark.parametrize("error, message", [
+    (prawcore.exceptions.NotFound(response(404)), "does not exist"),
+    (prawcore.exceptions.Redirect(response(302, "https://www.reddit.com/subreddits/search")), "does not exist"),
+    (prawcore.exceptions.Forbidden(response(403)), "private")
+], ids=["not_found", "redirect", "forbidden"])
+def test_unavailable_subreddits_raise_value_error(error, message):
+    with pytest.raises(ValueError, match=message):
+        source(error).subreddit("missing")
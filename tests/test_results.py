@@ -0,0 +1,141 @@
+import threading
+import time
+import pandas as pd
+import pytest
+from src.results import LocalBackend, LocalRedis, RedisBackend, ResultCache
+
+
+class StubReport:
+    # LocalBackend sizes entries by their frames; pickled as is by RedisBackend.
+    def __init__(self, name, rows=10):
+        self.name = name
+        self.df_posts = pd.DataFrame({"id": [f"{name}{i}" for i in range(rows)]})
+        self.df_comments = None
+
+
+def local_backend():
+    return LocalBackend()
+
+
+def redis_backend():
+    return RedisBackend(LocalRedis())
+
+
+backends = pytest.mark.parametrize("make_backend", [local_backend, redis_backend], ids=["local", "redis"])
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def eventually(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@backends
+def test_concurrent_misses_share_one_fetch(make_backend):
+    cache = ResultCache(make_backend())
+    calls = []
+    barrier = threading.Barrier(8)
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return StubReport("a")
+
+    def viewer():
+        barrier.wait()
+        results.append(cache.get_or_compute("key", compute))
+
+    threads = [threading.Thread(target=viewer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [report.name for report in results] == ["a"] * 8
+    assert cache.lookup("key")[1] == "fresh"
+
+
+@backends
+def test_stale_report_is_served_while_one_refresh_runs(make_backend):
+    clock = Clock()
+    cache = ResultCache(make_backend(), ttl=10, stale_ttl=10, clock=clock)
+    cache.put("key", StubReport("old"))
+    clock.now += 15
+    refreshed = []
+
+    def refresh():
+        refreshed.append(1)
+        return StubReport("new")
+
+    assert cache.get("key", refresh=refresh).name == "old"
+    eventually(lambda: cache.lookup("key")[1] == "fresh")
+    assert cache.lookup("key")[0].name == "new"
+    assert len(refreshed) == 1
+
+    clock.now += 25
+    assert cache.get("key") is None
+
+
+@backends
+def test_errors_reach_every_waiter_and_nothing_is_stored(make_backend):
+    cache = ResultCache(make_backend())
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError("subreddit is private")
+
+    def leader():
+        try:
+            cache.get_or_compute("key", compute)
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+    flight, is_leader = cache.claim("key")
+    assert not is_leader
+    release.set()
+    with pytest.raises(ValueError, match="private"):
+        cache.wait(flight)
+    thread.join()
+    assert len(errors) == 1
+    assert cache.lookup("key") == (None, None)
+    # The lock is released, so the next request fetches again.
+    assert cache.get_or_compute("key", lambda: StubReport("b")).name == "b"
+
+
+def test_local_backend_evicts_least_recently_used_past_its_budget():
+    size = LocalBackend().sizeof(StubReport("a", 100))
+    cache = ResultCache(LocalBackend(max_bytes=int(size * 2.5)))
+    for name in "abc":
+        cache.put(name, StubReport(name, 100))
+    assert cache.lookup("a") == (None, None)
+    assert cache.lookup("b")[0].name == "b"
+    assert cache.lookup("c")[0].name == "c"
+
+    # Larger than the whole budget: handed back to waiters but never kept.
+    cache.put("huge", StubReport("huge", 1000))
+    assert cache.lookup("huge") == (None, None)
+    assert cache.lookup("c")[0].name == "c"
+
+
+def test_redis_backend_entries_expire():
+    cache = ResultCache(RedisBackend(LocalRedis(), ttl=0.05))
+    cache.put("key", StubReport("a"))
+    assert cache.lookup("key")[0].name == "a"
+    time.sleep(0.1)
+    assert cache.lookup("key") == (None, None)
@@ -0,0 +1,69 @@
+from collections import Counter
+import numpy as np
+from src.sketches import CountMin, HyperLogLog, SpaceSaving, sketch_from_bytes
+
+rng = np.random.default_rng(0)
+# A Zipf-like stream of author names, as a subreddit's comment authors would be.
+vocabulary = np.array([f"user_{i}" for i in range(50000)], dtype=object)
+weights = 1 / np.arange(1, len(vocabulary) + 1) ** 1.05
+stream = vocabulary[rng.choice(len(vocabulary), 200000, p=weights / weights.sum())]
+batches = [Counter(stream[start:start + 5000]) for start in range(0, len(stream), 5000)]
+exact = Counter(stream)
+
+
+def test_hyperloglog_relative_error():
+    for n in [500, 100000]:
+        keys = [f"user_{i}" for i in range(n)]
+        sketch = HyperLogLog()
+        for start in range(0, n, 20000):
+            sketch.update(keys[start:start + 20000])
+        # Three standard errors at the default precision: 3 * 1.04 / sqrt(2**14), about 2.4%.
+        assert abs(sketch.count() - n) / n <= 3 * 1.04 / 2 ** 7
+
+    first, second = HyperLogLog().update(stream[:100000]), HyperLogLog().update(stream[100000:])
+    assert np.array_equal(first.update(second).registers, HyperLogLog().update(stream).registers)
+
+
+def test_count_min_never_underestimates():
+    sketch, other = CountMin(), CountMin()
+    for i, batch in enumerate(batches):
+        (sketch if i % 2 else other).update(batch)
+    sketch.update(other)
+    over = sketch.estimate(list(exact)) - np.fromiter(exact.values(), float, len(exact))
+    assert over.min() >= 0
+    # Each estimate is within epsilon * N of the truth with probability 1 - delta.
+    assert (over > sketch.epsilon * len(stream)).mean() <= sketch.delta
+
+
+def test_space_saving_bounds_after_merges():
+    capacity = 500
+    shards = [SpaceSaving(capacity) for _ in range(4)]
+    for i, batch in enumerate(batches):
+        shards[i % 4].update(batch)
+    merged = (shards[0] + shards[1]) + (shards[2] + shards[3])
+
+    assert merged.total == len(stream)
+    assert merged.floor <= len(stream) / capacity
+    for author, count in merged.items():
+        # Guaranteed count (count - error) <= true count <= upper count (count).
+        assert count - merged.error(author) <= exact[author] <= count
+        assert merged.error(author) <= merged.floor
+    heavy = [author for author, count in exact.items() if count > len(stream) / capacity]
+    assert heavy and all(author in merged.keys() for author in heavy)
+    assert [author for author, _ in merged.most_common(5)] == [author for author, _ in exact.most_common(5)]
+
+
+def test_round_trips_through_bytes():
+    hll = HyperLogLog().update(stream)
+    count_min = CountMin().update(exact)
+    space_saving = SpaceSaving(100).update(exact)
+    for sketch in [hll, count_min, space_saving]:
+        data = sketch.to_bytes()
+        restored = sketch_from_bytes(data)
+        assert type(restored) is type(sketch)
+        assert restored.to_bytes() == data
+    assert sketch_from_bytes(hll.to_bytes()).count() == hll.count()
+    assert list(sketch_from_bytes(count_min.to_bytes()).estimate(["user_0", "user_9"])) == \
+        list(count_min.estimate(["user_0", "user_9"]))
+    restored = sketch_from_bytes(space_saving.to_bytes())
+    assert restored.most_common() == space_saving.most_common() and restored.floor == space_saving.floor
@@ -0,0 +1,43 @@
+import pytest
+from src.analysis import ThreadInsight
+from src.ratelimit import TokenBucket
+from src.source import RecordingSource, ReplaySource, synthetic_fixture
+
+names = ["alpha", "beta", "gamma"]
+
+
+def fixtures():
+    # Different sizes, so a thread served from the wrong subreddit shows up in the counts.
+    return {
+        name: synthetic_fixture(name, 30 + 10 * seed, 400 + 200 * seed, seed=seed) for seed, name in enumerate(names)
+    }
+
+
+def test_replaying_several_fixtures_reads_every_thread():
+    replayed = fixtures()
+    # A fast limiter stands in for the fixed courtesy sleeps.
+    insight = ThreadInsight(ReplaySource(replayed), limiter=TokenBucket(10000, 10000))
+    for name in names:
+        posts, _, comments, coverage = insight.fetch(name)
+        expected = replayed[name]["comments"]
+        assert coverage["coverage"] == 1.0
+        assert comments.num_rows == sum(len(thread) for thread in expected.values())
+        comment_ids = {comment["id"] for thread in expected.values() for comment in thread}
+        assert set(comments.column("comment_id").to_pylist()) == comment_ids
+
+
+def test_replay_rejects_ids_shared_between_fixtures():
+    alpha = synthetic_fixture("alpha", 5, 20)
+    with pytest.raises(ValueError, match="appears in both"):
+        ReplaySource({"alpha": alpha, "beta": {**alpha, "name": "beta"}})
+
+
+def test_recording_keeps_authors_with_their_subreddit(tmp_path):
+    recorder = RecordingSource(ReplaySource(fixtures()), tmp_path)
+    for name in names:
+        list(recorder.new_posts(name, 100))
+    fullnames = {post["author_fullname"] for name in names for post in recorder.fixtures[name]["posts"]}
+    recorder.authors_by_ids([fullname for fullname in fullnames if fullname])
+    for name in names:
+        posted = {post["author"] for post in recorder.fixtures[name]["posts"] if post["author_fullname"]}
+        assert set(recorder.fixtures[name]["authors"]) == posted
@@ -0,0 +1,71 @@
+import pytest
+from src.preprocess import preprocesscomments, preprocessposts
+from src.threads import thread_structure
+
+T = 1700000000.0
+
+
+def post(post_id, created):
+    return {"id": post_id, "author": "op", "title": "", "selftext": "", "is_self": True, "num_comments": 0,
+            "over_18": False, "spoiler": False, "locked": False, "gilded": 0, "upvotes": 1, "created_utc": created,
+            "post_type": "text", "account_age_days": 100.0}
+
+
+def comment(comment_id, author, parent_id, created, depth, post_id="p1"):
+    return {"comment_id": comment_id, "comment_author": author, "comment_upvotes": 1, "comment_created_utc": created,
+            "post_id": post_id, "parent_id": parent_id, "depth": depth}
+
+
+# p1:  c1 alice (+60)
+#        c2 bob (+90)
+#          c4 alice (+85, before its parent: clock skew)
+#            c5 bob (+300)
+#        c3 carol (+200)
+#        c6 [deleted] (+400)
+#      c7 dave (+500), replying to a comment that wasn't fetched
+#      c8 eve (+30)
+# p2:  c9 frank (-10 before the post)
+posts = [post("p1", T), post("p2", T + 1000)]
+comments = [
+    comment("c1", "alice", "t3_p1", T + 60, 0),
+    comment("c2", "bob", "t1_c1", T + 90, 1),
+    comment("c3", "carol", "t1_c1", T + 200, 1),
+    comment("c4", "alice", "t1_c2", T + 85, 2),
+    comment("c5", "bob", "t1_c4", T + 300, 3),
+    comment("c6", "[deleted]", "t1_c1", T + 400, 1),
+    comment("c7", "dave", "t1_missing", T + 500, 1),
+    comment("c8", "eve", "t3_p1", T + 30, 0),
+    comment("c9", "frank", "t3_p2", T + 990, 0, post_id="p2"),
+]
+
+
+def test_thread_structure_of_a_small_tree():
+    structure = thread_structure(preprocesscomments(comments), preprocessposts(posts), k=1)
+    assert structure["comments"] == 9
+    assert structure["top_level"] == 3
+    assert structure["replies"] == 5
+    assert structure["orphans"] == 1
+    assert structure["max_depth"] == 3
+    assert structure["depth_distribution"] == {0: 3, 1: 4, 2: 1, 3: 1}
+    # c1, c2 and c4 got replies; c1 got three.
+    assert structure["replied_share"] == round(3 / 9, 4)
+    assert structure["max_replies"] == 3
+
+    # Reply latencies 30, 140, 0 (clamped), 215 and 340 seconds.
+    assert structure["reply_latency"]["p50"] == 140
+    assert structure["reply_latency"]["p99"] == pytest.approx(340 - 0.04 * (340 - 215))
+    # First replies: c1 after 30s, c2 after 0s (clamped), c4 after 215s.
+    assert structure["comment_first_reply"]["p50"] == 30
+    # p1's first comment came after 30s; p2's before the post, clamped to 0.
+    assert structure["post_first_reply"]["p50"] == 15
+
+    # bob -> alice twice, carol -> alice and alice -> bob once; replies to or from [deleted] don't count.
+    assert structure["reply_edges"] == 3
+    assert structure["top_reply_edges"].to_dict("records") == [{"author": "bob", "replied_to": "alice", "replies": 2}]
+
+
+def test_thread_structure_without_comments():
+    structure = thread_structure(preprocesscomments([]), preprocessposts(posts))
+    assert structure["comments"] == structure["replies"] == structure["reply_edges"] == 0
+    assert structure["max_depth"] is None
+    assert structure["reply_latency"]["p50"] is None
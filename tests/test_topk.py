@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from src.topk import author_activity, excluded_commenters, top_authors, top_counts, top_k_indices
+
+
+def test_top_k_indices_breaks_ties_by_position():
+    values = [3, 7, 5, 7, 1, 5, 7]
+    assert list(top_k_indices(values, 2)) == [1, 3]
+    # The cutoff falls inside the 5s: the earlier one wins.
+    assert list(top_k_indices(values, 4)) == [1, 3, 6, 2]
+
+
+def test_top_k_indices_with_k_out_of_range():
+    values = [2.0, np.nan, 9.0]
+    assert list(top_k_indices(values, 3)) == [2, 0, 1]
+    assert list(top_k_indices(values, 10)) == [2, 0, 1]
+    assert list(top_k_indices(values, 0)) == []
+    assert list(top_k_indices([], 5)) == []
+
+
+def test_top_k_indices_matches_a_stable_sort():
+    values = np.random.default_rng(0).integers(0, 20, 1000)
+    order = np.argsort(-values, kind="stable")
+    for k in [1, 5, 50, 999, 1000, 2000]:
+        assert list(top_k_indices(values, k)) == list(order[:k])
+
+
+def test_top_authors_ranks_by_count_then_name():
+    activity = author_activity(
+        pd.Series(["carol", "bob", "AutoModerator", "dave"]),
+        pd.Series(["bob", "[deleted]", "[deleted]", "[Deleted]", "alice", "alice", "carol", "autoModerator", "eve"])
+    )
+    assert top_authors(activity, k=3).to_dict() == {"[deleted]": 2, "alice": 2, "bob": 2}
+    # Exclusions are case-insensitive; the tie for third place at 1 goes to the alphabetically first name.
+    assert top_authors(activity, k=3, excluded=excluded_commenters).to_dict() == {"alice": 2, "bob": 2, "carol": 2}
+    assert list(top_authors(activity, k=4, excluded=excluded_commenters).index) == ["alice", "bob", "carol", "dave"]
+    # k past the number of authors returns them all; authors without comments drop out of a comment ranking.
+    assert top_authors(activity, "comments", k=10, excluded=excluded_commenters).to_dict() == {
+        "alice": 2, "bob": 1, "carol": 1, "eve": 1
+    }
+
+
+def test_top_counts_ranks_like_top_authors():
+    counts = {"bob": 2, "alice": 2, "[deleted]": 5, "carol": 1, "dave": 0}
+    assert top_counts(counts, 2, excluded_commenters) == [("alice", 2), ("bob", 2)]
+    assert top_counts(counts, 10) == [("[deleted]", 5), ("alice", 2), ("bob", 2), ("carol", 1)]
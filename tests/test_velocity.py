@@ -0,0 +1,36 @@
+import numpy as np
+from src.velocity import VelocityRollup
+
+sizes = {"10s": (10, 60)}
+
+
+def rollup(post_ids, post_created, comment_posts, comment_created):
+    return VelocityRollup(sizes).add_posts(post_ids, post_created).add_comments(comment_posts, comment_created)
+
+
+def test_counts_match_a_dense_binning():
+    rng = np.random.default_rng(0)
+    post_ids = [f"p{i}" for i in range(20)]
+    post_created = rng.uniform(0, 100, len(post_ids))
+    rows = rng.integers(0, len(post_ids), 2000)
+    comment_created = post_created[rows] + rng.exponential(30, len(rows))
+    velocity = rollup(post_ids, post_created, np.array(post_ids)[rows], comment_created).post_velocity("10s")
+
+    dense = np.zeros((len(post_ids), 7), np.int64)
+    np.add.at(dense, (rows, np.minimum((comment_created - post_created[rows]) // 10, 6).astype(int)), 1)
+    assert (velocity["comments"] == dense[:, :-1].sum(axis=1)).all()
+    assert np.allclose(velocity["first_bucket_rate"], dense[:, 0] * 360)
+    assert np.allclose(velocity["peak_hours_since_post"], dense[:, :-1].argmax(axis=1) * 10 / 3600)
+
+
+def test_merged_shards_equal_the_whole():
+    post_ids, post_created = ["a", "b", "c"], [0.0, 5.0, 40.0]
+    comment_posts = ["a", "a", "b", "c", "c", "c", "x"]
+    comment_created = [3.0, 25.0, 5.0, 41.0, 45.0, 200.0, 1.0]
+    whole = rollup(post_ids, post_created, comment_posts, comment_created)
+    merged = rollup(post_ids, post_created, comment_posts[:3], comment_created[:3]).merge(
+        rollup(post_ids[::-1], post_created[::-1], comment_posts[3:], comment_created[3:])
+    )
+    assert merged.unmatched == whole.unmatched == 1
+    assert merged.curve("10s").equals(whole.curve("10s"))
+    assert merged.post_velocity("10s").equals(whole.post_velocity("10s"))